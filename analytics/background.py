@@ -0,0 +1,135 @@
+"""Фоновые расчёты для app.py: загрузка, таблицы показателей и графики
+считаются в пуле потоков, а скрипт Streamlit выводит готовые части.
+
+Задача принадлежит сессии (owner) и занимает в ней слот ("kpi", "charts"...).
+Перезапуск скрипта с тем же ключом подключается к уже идущей задаче, новая
+задача в слоте отменяет прежнюю, а cancel(owner) - все задачи сессии (смена
+фильтров). Отмена кооперативная: задача вызывает job.check() между этапами
+и прекращается на ближайшем из них.
+
+Потоки, а не процессы: задачи работают с кубом и таблицами из общего кэша,
+без копирования между процессами; numpy и pandas на время расчёта отпускают GIL.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+WORKERS = 4
+# Загрузки выгрузок (минуты на большой файл) - в отдельном пуле: несколько
+# больших загрузок не задерживают таблицы и графики других сессий
+LOAD_WORKERS = 2
+# Период опроса задачи скриптом, с: за это время показываются готовые части
+POLL_SECONDS = 0.1
+
+
+class Cancelled(Exception):
+    """Задача отменена: её результат больше не нужен."""
+
+
+class Job:
+    """Задача в пуле: готовые части (parts) видны до завершения."""
+
+    def __init__(self, key):
+        self.key = key
+        self.parts = []
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def check(self):
+        """Точка отмены между этапами."""
+        if self.cancelled:
+            raise Cancelled(self.key)
+
+    def emit(self, part):
+        """Готовая часть результата (таблицы, график): выводится, не дожидаясь остальных."""
+        self.check()
+        self.parts.append(part)
+
+
+class Jobs:
+    def __init__(self, workers=WORKERS, load_workers=LOAD_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analytics-job")
+        self._load_pool = ThreadPoolExecutor(max_workers=load_workers, thread_name_prefix="analytics-load")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, slot, key, fn, *args, loading=False):
+        """Запускает fn(job, *args) в слоте сессии; задача с тем же ключом переиспользуется.
+
+        loading=True - загрузка выгрузки, в пуле загрузок.
+        """
+        with self._lock:
+            job = self._jobs.get((owner, slot))
+            if job is not None and job.key == key and not job.cancelled:
+                return job
+            if job is not None:
+                job.cancel()
+            job = Job(key)
+            # Контекст скрипта (профилировщик этапов) переходит в поток задачи
+            pool = self._load_pool if loading else self._pool
+            job.future = pool.submit(contextvars.copy_context().run, fn, job, *args)
+            self._jobs[owner, slot] = job
+        job.future.add_done_callback(lambda _: self._forget(owner, slot, job))
+        return job
+
+    def _forget(self, owner, slot, job):
+        with self._lock:
+            if self._jobs.get((owner, slot)) is job:
+                del self._jobs[owner, slot]
+
+    def cancel(self, owner):
+        """Отменяет все задачи сессии."""
+        with self._lock:
+            jobs = [job for (o, _), job in self._jobs.items() if o == owner]
+        for job in jobs:
+            job.cancel()
+
+
+def follow(job, waiting=None, poll=POLL_SECONDS):
+    """Части результата по мере готовности; по завершении задачи - выход.
+
+    waiting(секунды ожидания) вызывается на каждом опросе: в Streamlit
+    вывод статуса - точка, где скрипт прерывается перезапуском.
+    """
+    shown = 0
+    waited = 0.0
+    while True:
+        done = job.future.done()
+        while shown < len(job.parts):
+            yield job.parts[shown]
+            shown += 1
+        if done:
+            return
+        if waiting is not None:
+            waiting(waited)
+        wait([job.future], timeout=poll)
+        waited += poll
+
+
+def result(job, waiting=None, poll=POLL_SECONDS):
+    """Дожидается задачи без частей; исключение задачи пробрасывается."""
+    for _ in follow(job, waiting, poll):
+        pass
+    return job.future.result()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_jobs():
+    """Общий пул задач процесса, как shared_cache()."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Jobs()
+        return _shared
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Лимит памяти кэша, МБ (переменная окружения DV_CACHE_MB)
+DEFAULT_CACHE_MB = 1024
+
+
+def content_hash(fileobj, block_size=8 * 1024 * 1024):
+    """Хэш содержимого загруженного файла (позиция чтения сохраняется)."""
+    digest = hashlib.blake2b(digest_size=16)
+    if hasattr(fileobj, "getbuffer"):
+        # UploadedFile - BytesIO: хэшируем без копирования содержимого
+        with fileobj.getbuffer() as view:
+            for start in range(0, len(view), block_size):
+                digest.update(view[start:start + block_size])
+        return digest.hexdigest()
+    position = fileobj.tell()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        digest.update(block)
+    fileobj.seek(position)
+    return digest.hexdigest()
+
+
+def sizeof(value):
+    """Оценка занимаемой памяти в байтах."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if isinstance(getattr(value, "nbytes", None), int):
+        # compact.SegmentStore и подобные - размер своих массивов
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """LRU-кэш с ограничением по памяти.
+
+    Значения считаются неизменяемыми: их разделяют все перезапуски
+    скрипта и все сессии, поэтому менять их на месте нельзя.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.current_bytes -= evicted
+        return value
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache():
+    """Общий кэш процесса: модуль импортируется один раз и переживает перезапуски app.py."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            max_mb = int(os.environ.get("DV_CACHE_MB", DEFAULT_CACHE_MB))
+            _shared = LRUCache(max_mb * 1024 * 1024)
+        return _shared
@@ -0,0 +1,119 @@
+"""Линейные графики с ограниченным объёмом данных для браузера.
+
+Каждая серия прореживается на сервере (LTTB) до ширины графика в точках,
+при большом числе точек используются WebGL-трассы (Scattergl), а число
+серий на одном графике ограничено - остальные показываются постранично.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+
+# Точек на серию после прореживания (примерно ширина графика в пикселях)
+PLOT_WIDTH = 1200
+# Всего точек на графике, начиная с которого используется WebGL
+GL_THRESHOLD = 5000
+# Серий на одном графике (оборудование на странице)
+MAX_TRACES = 20
+
+_COLORS = qualitative.Plotly
+_DASHES = ["solid", "dot", "dash", "longdash", "dashdot", "longdashdot"]
+
+
+def lttb(x, y, threshold):
+    """Индексы точек после прореживания Largest-Triangle-Three-Buckets."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        if end < next_end:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        indices[i + 1] = a
+    return indices
+
+
+def downsample(xs, ys, max_points=PLOT_WIDTH):
+    """Серия (даты, значения) не длиннее max_points."""
+    if len(xs) <= max_points:
+        return xs, ys
+    keep = lttb(xs.astype("datetime64[ns]").astype(np.int64), ys, max_points)
+    return xs[keep], ys[keep]
+
+
+def entity_pages(values, size=MAX_TRACES):
+    """Разбивка списка оборудования на страницы для графиков."""
+    values = sorted(pd.unique(pd.Series(values).dropna()).tolist(), key=str)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def line_figure(frame, x, y, color=None, line_dash=None, markers=True, title=None,
+                labels=None, max_points=PLOT_WIDTH):
+    """Аналог px.line для графиков дашборда с прореживанием и WebGL."""
+    labels = labels or {}
+    keys = [k for k in (color, line_dash) if k is not None]
+    if keys:
+        groups = list(frame.groupby(keys, sort=True, observed=True))
+    else:
+        groups = [((), frame)]
+
+    series = []
+    for key, part in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        part = part.sort_values(x)
+        xs = pd.to_datetime(part[x]).to_numpy()
+        ys = part[y].to_numpy(dtype=np.float64)
+        series.append((key, *downsample(xs, ys, max_points)))
+
+    total = sum(len(xs) for _, xs, _ in series)
+    trace = go.Scattergl if total > GL_THRESHOLD else go.Scatter
+    mode = "lines+markers" if markers and total <= GL_THRESHOLD else "lines"
+
+    color_of = _palette(frame, color, _COLORS)
+    dash_of = _palette(frame, line_dash, _DASHES)
+
+    fig = go.Figure()
+    for key, xs, ys in series:
+        values = dict(zip(keys, key))
+        fig.add_trace(trace(
+            x=xs, y=ys, mode=mode,
+            name=", ".join(str(v) for v in key) or y,
+            legendgroup=", ".join(str(v) for v in key),
+            showlegend=bool(keys),
+            line={
+                "color": color_of.get(values.get(color), _COLORS[0]),
+                "dash": dash_of.get(values.get(line_dash), "solid"),
+            },
+        ))
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+        legend_title_text=", ".join(labels.get(k, k) for k in keys),
+    )
+    return fig
+
+
+def _palette(frame, column, sequence):
+    if column is None:
+        return {}
+    values = sorted(pd.unique(frame[column].dropna()).tolist(), key=str)
+    return dict(zip(values, itertools.cycle(sequence)))
@@ -0,0 +1,141 @@
+"""Пакетный расчёт показателей без Streamlit.
+
+    python -m analytics exports/*.json --out results --format parquet --jobs 8
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import pandas as pd
+
+from analytics.ingest import load_json
+from analytics.pipeline import calendar_fund, compute_kpi
+
+# Скалярные средние из pipeline.period_averages -> колонки сводки
+SUMMARY_FIELDS = {
+    "overall_kkf": "Среднее значение Ккф",
+    "total_ppr": "Суммарное время ППР (Тппр)",
+    "avg_tpl": "Среднее значение Тпл",
+    "avg_chsm": "Среднее значение Тчсм",
+    "avg_kio": "Среднее значение Кио",
+    "avg_ktg": "Среднее значение Ктг",
+}
+
+
+def write_table(frame, path, fmt):
+    if fmt == "parquet":
+        frame.to_parquet(f"{path}.parquet", index=False)
+    else:
+        # utf-8-sig: кириллица в заголовках корректно открывается в Excel
+        frame.to_csv(f"{path}.csv", index=False, encoding="utf-8-sig")
+
+
+def output_names(paths):
+    """Имена результатов и сводки по файлам: [(имя таблиц, файл в сводке)].
+
+    Обычно - имя файла; у файлов с одинаковыми именами из разных каталогов
+    (a/march.json и b/march.json) - с каталогом, при повторе - с номером.
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    counts = Counter(stems)
+    names, used = [], set()
+    for path, stem in zip(paths, stems):
+        shown = os.path.basename(path)
+        if counts[stem] > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem, shown = f"{parent}_{stem}", path
+        name, i = stem, 2
+        while name in used:
+            name, i = f"{stem}_{i}", i + 1
+        used.add(name)
+        names.append((name, shown))
+    return names
+
+
+def process_file(path, name, shown, out_dir, fmt, period=(), shifts=(), equipment=(), fuels=(), seconds=False):
+    """Расчёт одного файла в процессе-исполнителе; таблицы пишутся здесь же
+    (out_dir/name_kkf...), shown - файл в сводке."""
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        df, segments = load_json(f, streaming=True, seconds=seconds)
+    kkf_df, kisvr_df, averages = compute_kpi(df, segments, period, shifts, equipment, fuels)
+
+    stem = os.path.join(out_dir, name)
+    write_table(kkf_df, f"{stem}_kkf", fmt)
+    write_table(kisvr_df, f"{stem}_kisvr", fmt)
+    write_table(averages["avg_kkf"], f"{stem}_avg_kkf", fmt)
+    write_table(averages["avg_kisvr"], f"{stem}_avg_kisvr", fmt)
+
+    summary = {"Файл": shown, "Календарный фонд времени Тк": calendar_fund(df, period)}
+    summary.update({label: averages[field] for field, label in SUMMARY_FIELDS.items()})
+    summary.update({
+        f"Среднее значение Кисвр по {shift}": value
+        for shift, value in averages["kisvr_by_shift"].items()
+    })
+    return summary, len(df), len(segments), time.perf_counter() - start
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m analytics",
+        description="Расчёт Ккф, Кио, Ктг, Кисвр и Тчсм по JSON-выгрузкам.",
+    )
+    parser.add_argument("inputs", nargs="+", help="JSON-файлы выгрузки")
+    parser.add_argument("--out", default="results", help="каталог для результатов")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument("--start", type=date.fromisoformat, help="начало периода, ГГГГ-ММ-ДД")
+    parser.add_argument("--end", type=date.fromisoformat, help="конец периода, ГГГГ-ММ-ДД")
+    parser.add_argument("--shift", action="append", default=[], help="смена (можно несколько раз)")
+    parser.add_argument("--equipment", action="append", default=[], help="оборудование")
+    parser.add_argument("--fuel", action="append", default=[], help="топливо")
+    parser.add_argument("--seconds", action="store_true", help="учитывать секунды в продолжительности")
+    args = parser.parse_args(argv)
+    if (args.start is None) != (args.end is None):
+        parser.error("период задаётся парой --start и --end")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    period = (args.start, args.end) if args.start else ()
+    os.makedirs(args.out, exist_ok=True)
+
+    summaries, failed = [], 0
+    records = segments = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(
+                process_file, path, name, shown, args.out, args.format,
+                period, args.shift, args.equipment, args.fuel, args.seconds,
+            ): path
+            for path, (name, shown) in zip(args.inputs, output_names(args.inputs))
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary, n_records, n_segments, seconds = future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"ошибка {path}: {exc}", file=sys.stderr)
+                continue
+            summaries.append(summary)
+            records += n_records
+            segments += n_segments
+            print(f"{path}: {n_records} записей, {n_segments} участков, {seconds:.2f} с")
+
+    if summaries:
+        summary = pd.DataFrame(summaries).sort_values("Файл")
+        write_table(summary, os.path.join(args.out, "averages"), args.format)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"файлов: {len(summaries)} (ошибок: {failed}), время: {elapsed:.2f} с, "
+        f"{records / elapsed:,.0f} записей/с, {segments / elapsed:,.0f} участков/с"
+    )
+    return 1 if failed else 0
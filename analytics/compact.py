@@ -0,0 +1,144 @@
+"""Компактное хранение участков загруженной выгрузки.
+
+Участки записи i лежат подряд в позициях offsets[i]:offsets[i + 1] (CSR):
+продолжительность - целым числом минут (uint16) или секунд (uint32),
+вид использования - код int8, признак работы двигателя - битовая маска.
+Номер записи на участок не хранится. Часы восстанавливаются тем же
+выражением, что и при разборе, поэтому расчёт совпадает с табличным.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+def _encode(hours):
+    # Часы из durations.decode_hours - целые часы, минуты и секунды: храним
+    # самую мелкую единицу, из которой они восстанавливаются без потерь
+    for unit, dtype in ((60, np.uint16), (3600, np.uint32)):
+        units = np.rint(hours * unit).astype(dtype)
+        if np.array_equal(_decode(units, unit), hours):
+            return units, unit
+    return hours, None
+
+
+def _decode(units, unit):
+    if unit is None:
+        return units
+    units = units.astype(np.int64)
+    if unit == 60:
+        return (units // 60).astype(np.float64) + (units % 60) / 60
+    hours = (units // 3600).astype(np.float64) + (units // 60 % 60) / 60
+    return hours + (units % 60) / 3600
+
+
+def same_categories(parts):
+    """Части с одним типом категорий для union_categoricals: у части без
+    значений (блок без топлива или без участков) категории - пустой object."""
+    dtypes = {str(p.categories.dtype): p.categories.dtype for p in parts if len(p.categories)}
+    dtype = next(iter(dtypes.values())) if len(dtypes) == 1 else object
+    return [
+        p if p.categories.dtype == dtype
+        else pd.Categorical.from_codes(p.codes, categories=p.categories.astype(dtype))
+        for p in parts
+    ]
+
+
+class SegmentStore:
+    """Участки всех записей выгрузки в плоских массивах с CSR-смещениями."""
+
+    def __init__(self, offsets, durations, unit, usage_codes, usage_categories, engine_bits):
+        self.offsets = offsets
+        self.durations = durations
+        self.unit = unit
+        self.usage_codes = usage_codes
+        self.usage_categories = usage_categories
+        self.engine_bits = engine_bits
+
+    @classmethod
+    def from_frame(cls, segments, n_records):
+        """Из таблицы explode_segments (rec, hours, engine, usage)."""
+        rec = segments["rec"].to_numpy(dtype=np.int64)
+        order = None
+        if len(rec) and (np.diff(rec) < 0).any():
+            order = np.argsort(rec, kind="stable")
+            rec = rec[order]
+
+        def column(name):
+            values = segments[name]
+            return values.iloc[order] if order is not None else values
+
+        usage = pd.Categorical(column("usage"))
+        if len(usage.categories) > np.iinfo(np.int8).max:
+            raise ValueError("Слишком много видов использования для кода int8")
+        durations, unit = _encode(column("hours").to_numpy(dtype=np.float64))
+        offsets = np.zeros(n_records + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rec, minlength=n_records), out=offsets[1:])
+        return cls(
+            offsets,
+            durations,
+            unit,
+            usage.codes.astype(np.int8),
+            usage.categories,
+            np.packbits(column("engine").to_numpy(dtype=bool)),
+        )
+
+    @classmethod
+    def concat(cls, stores):
+        """Склейка блоков по порядку записей (потоковая загрузка)."""
+        stores = list(stores)
+        units = {s.unit for s in stores}
+        if None in units:
+            unit, durations = None, np.concatenate([s.hours() for s in stores])
+        elif len(units) == 1:
+            unit, durations = units.pop(), np.concatenate([s.durations for s in stores])
+        else:
+            # Блоки в минутах и в секундах - всё в секундах
+            unit = 3600
+            durations = np.concatenate([
+                s.durations.astype(np.uint32) * np.uint32(unit // s.unit) for s in stores
+            ])
+        usage = union_categoricals(same_categories([s.usage() for s in stores]), ignore_order=True)
+        if len(usage.categories) > np.iinfo(np.int8).max:
+            raise ValueError("Слишком много видов использования для кода int8")
+        starts = np.cumsum([0] + [len(s) for s in stores[:-1]])
+        offsets = np.concatenate(
+            [[0]] + [s.offsets[1:] + start for s, start in zip(stores, starts)]
+        ).astype(np.int64)
+        engine = np.concatenate([s.engine() for s in stores])
+        return cls(offsets, durations, unit, usage.codes.astype(np.int8), usage.categories, np.packbits(engine))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def n_records(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return (
+            self.offsets.nbytes + self.durations.nbytes
+            + self.usage_codes.nbytes + self.engine_bits.nbytes
+        )
+
+    def rec(self):
+        """Номер записи для каждого участка."""
+        return np.repeat(np.arange(self.n_records, dtype=np.int64), np.diff(self.offsets))
+
+    def hours(self):
+        return _decode(self.durations, self.unit)
+
+    def engine(self):
+        return np.unpackbits(self.engine_bits, count=len(self)).astype(bool)
+
+    def usage(self):
+        return pd.Categorical.from_codes(self.usage_codes, self.usage_categories)
+
+    def arrays(self):
+        """rec, hours, engine, usage - как колонки таблицы сегментов."""
+        return self.rec(), self.hours(), self.engine(), self.usage()
+
+    def frame(self):
+        """Таблица сегментов как у explode_segments."""
+        rec, hours, engine, usage = self.arrays()
+        return pd.DataFrame({"rec": rec, "hours": hours, "engine": engine, "usage": usage})
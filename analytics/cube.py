@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from analytics.kpi import (
+    BUCKETS, DATE, EQUIPMENT, FUEL, SHIFT, kisvr_table, kkf_table,
+)
+
+# Ячейка куба: оборудование x смена x день x топливо
+CELL_KEYS = [EQUIPMENT, SHIFT, DATE, FUEL]
+
+# Суммы в ячейках - целые секунды
+UNITS = 3600
+
+
+def sum_cells(cube):
+    """Сворачивает строки с одинаковыми ключами ячейки (куб нескольких выгрузок)."""
+    grouped = cube.groupby(CELL_KEYS, sort=True, observed=True, dropna=False)
+    return grouped[BUCKETS].sum().reset_index()
+
+
+def build_cube(reduced):
+    """Суммы времени по ячейкам (строится один раз на загрузку).
+
+    Все фильтры боковой панели - по измерениям ячейки, поэтому любой срез
+    считается суммированием ячеек, а коэффициенты - уже по суммам.
+    Продолжительности участков - целые минуты или секунды, поэтому суммы
+    хранятся точно, целыми секундами, и не зависят от порядка сложения.
+    Прежний расчёт складывает часы с плавающей точкой по порядку записей:
+    значение ровно на границе округления (13.5 ч / 24 = 0.5625) может
+    отличаться от него в последнем знаке.
+    Записи без даты или оборудования в таблицы не попадают и здесь отброшены.
+    """
+    valid = reduced[DATE].notna() & reduced[EQUIPMENT].notna()
+    reduced = reduced[valid]
+    cube = reduced[CELL_KEYS].copy()
+    cube[DATE] = cube[DATE].dt.normalize()
+    # Часы записи - сумма кратных 1/3600: погрешность много меньше секунды
+    cube[BUCKETS] = np.rint(reduced[BUCKETS].to_numpy(dtype=np.float64) * UNITS).astype(np.int64)
+    return sum_cells(cube)
+
+
+def slice_cube(cube, period=(), shifts=(), equipment=(), fuels=()):
+    """Срез куба по фильтрам (та же семантика, что у pipeline.apply_filters)."""
+    mask = pd.Series(True, index=cube.index)
+    if len(period) == 2:
+        start, end = period
+        mask &= (cube[DATE] >= pd.Timestamp(start)) & (cube[DATE] <= pd.Timestamp(end))
+    if shifts:
+        mask &= cube[SHIFT].isin(shifts)
+    if equipment:
+        mask &= cube[EQUIPMENT].isin(equipment)
+    if fuels:
+        mask &= cube[FUEL].isin(fuels)
+    return cube[mask]
+
+
+def _hours(cells, keys):
+    # Целые суммы точны в любом порядке; часы - одним делением на группу.
+    # Группы - по Timestamp полуночи, в таблицах дата - datetime.date
+    sums = cells.groupby(keys, sort=True, observed=True)[BUCKETS].sum() / UNITS
+    days = sums.index.levels[-1]
+    return sums.set_axis(sums.index.set_levels(pd.Index(days.date, name=DATE), level=DATE))
+
+
+def cube_kkf(cells):
+    return kkf_table(_hours(cells, [EQUIPMENT, DATE]))
+
+
+def cube_kisvr(cells):
+    return kisvr_table(_hours(cells, [EQUIPMENT, SHIFT, DATE]))
@@ -0,0 +1,93 @@
+"""Разбор продолжительностей участков ("0001-01-01T01:30:00") в часы.
+
+Продолжительность приходит как дата-время, от которого значимо только время
+суток. Различных значений мало (минуты смены), поэтому разбираются только
+уникальные строки, а результаты запоминаются между вызовами.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Предел таблицы запомненных значений (на каждую точность)
+MEMO_LIMIT = 100_000
+
+_memo = {False: {}, True: {}}
+_memo_lock = threading.Lock()
+
+# Позиции в "ГГГГ-ММ-ДДTчч:мм:сс"
+_WIDTH = 19
+_HOUR, _MINUTE, _SECOND = slice(11, 13), slice(14, 16), slice(17, 19)
+
+
+def _hours(hour, minute, second, seconds):
+    # Тот же порядок операций, что и d.hour + d.minute / 60 в прежнем расчёте
+    hours = hour + minute / 60
+    return hours + second / 3600 if seconds else hours
+
+
+def _parse_fixed(values, seconds):
+    """Векторный разбор строк фиксированного формата; NaN там, где формат другой."""
+    result = np.full(len(values), np.nan)
+    prefixes = [v[:_WIDTH] if isinstance(v, str) and len(v) >= _WIDTH else "" for v in values]
+    chars = np.array(prefixes, dtype=f"<U{_WIDTH}").view(np.uint32).reshape(len(values), _WIDTH)
+    digits = chars - ord("0")
+    fixed = (
+        np.isin(chars[:, 10], [ord("T"), ord(" ")])
+        & (chars[:, 13] == ord(":")) & (chars[:, 16] == ord(":"))
+        & (digits[:, [11, 12, 14, 15, 17, 18]] < 10).all(axis=1)
+    )
+
+    def number(part):
+        return (digits[:, part.start] * 10 + digits[:, part.start + 1]).astype(np.float64)
+
+    hours = _hours(number(_HOUR), number(_MINUTE), number(_SECOND), seconds)
+    result[fixed] = hours[fixed]
+    return result
+
+
+def _parse_slow(value, seconds):
+    d = datetime.fromisoformat(value)
+    return _hours(d.hour, d.minute, d.second, seconds)
+
+
+def parse_unique(values, seconds=False):
+    """Часы для массива различных строк: таблица запомненных, векторный разбор, fromisoformat."""
+    memo = _memo[seconds]
+    table = np.array([memo.get(v, np.nan) for v in values], dtype=np.float64)
+    missing = np.flatnonzero(np.isnan(table))
+    if len(missing):
+        unknown = [values[i] for i in missing]
+        parsed = _parse_fixed(unknown, seconds)
+        # Нестандартные строки (часовой пояс, без секунд и т.п.) - как раньше
+        for i in np.flatnonzero(np.isnan(parsed)):
+            parsed[i] = _parse_slow(unknown[i], seconds)
+        table[missing] = parsed
+        with _memo_lock:
+            if len(memo) + len(unknown) > MEMO_LIMIT:
+                memo.clear()
+            memo.update(zip(unknown, parsed.tolist()))
+    return table
+
+
+def decode_hours(values, seconds=False):
+    """Продолжительности -> часы (float64) за один проход по колонке.
+
+    seconds=False повторяет прежний расчёт (часы + минуты/60, секунды
+    отбрасываются), seconds=True добавляет секунды. Пустая продолжительность
+    (null) - ValueError, как некорректная строка в fromisoformat.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # factorize даёт null код -1, а [-1] взял бы последнее значение
+    if (codes < 0).any():
+        raise ValueError("Пустая продолжительность участка (null)")
+    if not len(uniques):
+        return np.zeros(len(codes), dtype=np.float64)
+    return parse_unique(list(uniques), seconds)[codes]
+
+
+def clear_memo():
+    with _memo_lock:
+        for memo in _memo.values():
+            memo.clear()
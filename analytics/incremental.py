@@ -0,0 +1,237 @@
+"""Накопленная история с дозагрузкой выгрузок.
+
+Выгрузка заменяет в истории все данные по своим ячейкам (оборудование,
+смена, день): повторная загрузка того же файла ничего не меняет, а
+исправленная выгрузка за прошлые дни заменяет старые значения. После
+дозагрузки пересчитываются только затронутые строки таблиц Ккф
+(оборудование, день) и Кисвр (оборудование, смена, день), а средние за
+всю историю - по накопленным суммам, без прохода по таблицам.
+
+На диске (каталог root):
+    records/ГГГГ-ММ-ДД.parquet - записи дня с суммами времени по видам;
+    cube.parquet, kkf.parquet, kisvr.parquet - куб и таблицы показателей;
+    totals.json - накопленные суммы для средних.
+"""
+import json
+import os
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pandas as pd
+
+from analytics.cube import CELL_KEYS, build_cube, cube_kisvr, cube_kkf
+from analytics.ingest import concat_frames
+from analytics.kpi import (
+    BUCKETS, COL_KIO, COL_KISVR, COL_KKF, COL_KTG, COL_TCHSM, COL_TPL, COL_TPPR,
+    DATE, DIMENSIONS, EQUIPMENT, FUEL, SHIFT, SHIFTS, reduce_records,
+)
+
+RECORDS_DIR = "records"
+TOTALS_FILE = "totals.json"
+TABLES = ["cube", "kkf", "kisvr"]
+
+# Выгрузка заменяет данные по этим ключам
+REPLACE_KEYS = [EQUIPMENT, SHIFT, DATE]
+DAY_KEYS = [EQUIPMENT, DATE]
+
+# Накопленные суммы: значения в таблицах округлены до 3 (2) знаков, поэтому
+# суммы хранятся точно - целыми тысячными (сотыми) и не копят погрешность
+KKF_TOTALS = {COL_KKF: 1000, COL_KIO: 1000, COL_KTG: 1000, COL_TPL: 100, COL_TPPR: 100}
+KISVR_TOTALS = {COL_KISVR: 1000, COL_TCHSM: 100}
+
+_CATEGORICAL = [SHIFT, EQUIPMENT, FUEL]
+
+
+def empty_store():
+    return {
+        "records": pd.DataFrame(columns=DIMENSIONS + BUCKETS),
+        "cube": pd.DataFrame(columns=CELL_KEYS + BUCKETS),
+        "kkf": pd.DataFrame(columns=DAY_KEYS),
+        "kisvr": pd.DataFrame(columns=REPLACE_KEYS),
+        "totals": table_totals(pd.DataFrame(columns=list(KKF_TOTALS)), pd.DataFrame(columns=[SHIFT])),
+    }
+
+
+def _scaled_sum(values, scale):
+    return int(np.rint(np.asarray(values, dtype=np.float64) * scale).astype(np.int64).sum())
+
+
+def table_totals(kkf_df, kisvr_df):
+    """Суммы колонок таблиц показателей (целыми долями) и число строк."""
+    totals = {"kkf": {"rows": len(kkf_df)}, "kisvr": {}}
+    for column, scale in KKF_TOTALS.items():
+        totals["kkf"][column] = _scaled_sum(kkf_df[column], scale) if len(kkf_df) else 0
+    for shift, part in kisvr_df.groupby(SHIFT, sort=True, observed=True):
+        totals["kisvr"][str(shift)] = {"rows": len(part)}
+        for column, scale in KISVR_TOTALS.items():
+            totals["kisvr"][str(shift)][column] = _scaled_sum(part[column], scale)
+    return totals
+
+
+def _combine(totals, other, sign):
+    result = dict(totals)
+    for key, value in other.items():
+        if isinstance(value, dict):
+            result[key] = _combine(totals.get(key, {}), value, sign)
+        else:
+            result[key] = totals.get(key, 0) + sign * value
+    return result
+
+
+def _mean(total, scale, rows, ndigits):
+    # Суммы точные, поэтому и округление точное (половина - вверх); у
+    # period_averages значение на границе округления зависит от погрешности суммы
+    if not rows:
+        return float("nan")
+    value = Decimal(total) / Decimal(scale * rows)
+    return float(value.quantize(Decimal(1).scaleb(-ndigits), rounding=ROUND_HALF_UP))
+
+
+def store_averages(store, shifts=SHIFTS):
+    """Средние за всю историю в формате pipeline.period_averages.
+
+    Метрики - из накопленных сумм; таблицы средних по оборудованию и
+    сменам - группировкой сохранённых таблиц показателей.
+    """
+    kkf_df, kisvr_df = store["kkf"], store["kisvr"]
+    kkf, by_shift = store["totals"]["kkf"], store["totals"]["kisvr"]
+    rows = kkf["rows"]
+
+    kisvr_by_shift = {}
+    for shift in shifts:
+        part = by_shift.get(str(shift), {"rows": 0})
+        kisvr_by_shift[shift] = _mean(part.get(COL_KISVR, 0), 1000, part["rows"], 3) if part["rows"] else 0
+    chsm_rows = sum(part["rows"] for part in by_shift.values())
+    chsm_total = sum(part.get(COL_TCHSM, 0) for part in by_shift.values())
+
+    return {
+        "avg_kkf": kkf_df.groupby(EQUIPMENT)[COL_KKF].mean().reset_index().rename(columns={COL_KKF: "Среднее Ккф"}),
+        "avg_kisvr": kisvr_df.groupby([EQUIPMENT, SHIFT])[COL_KISVR].mean().reset_index().rename(
+            columns={COL_KISVR: "Среднее Кисвр"}
+        ),
+        "overall_kkf": _mean(kkf[COL_KKF], 1000, rows, 3),
+        "kisvr_by_shift": kisvr_by_shift,
+        "total_ppr": kkf[COL_TPPR] / 100,
+        "avg_tpl": _mean(kkf[COL_TPL], 100, rows, 2),
+        "avg_chsm": _mean(chsm_total, 100, chsm_rows, 2),
+        "avg_kio": _mean(kkf[COL_KIO], 1000, rows, 3),
+        "avg_ktg": _mean(kkf[COL_KTG], 1000, rows, 3),
+    }
+
+
+def _key_index(frame, keys):
+    # Дата в кубе - Timestamp, в таблицах - date, в записях - со временем
+    columns = [
+        pd.DatetimeIndex(pd.to_datetime(frame[k])).normalize() if k == DATE else frame[k].astype(str)
+        for k in keys
+    ]
+    return pd.MultiIndex.from_arrays(columns, names=keys)
+
+
+def _days(values):
+    if isinstance(values.dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(values):
+        return values.dt.normalize()
+    return values
+
+
+def _matches(frame, keys_frame, keys):
+    """Маска строк frame с ключами из keys_frame.
+
+    Сначала отбор по дате (дозагрузка затрагивает несколько дней), точное
+    сравнение ключей - только для строк этих дней.
+    """
+    mask = np.zeros(len(frame), dtype=bool)
+    if frame.empty or keys_frame.empty:
+        return mask
+    days = _days(frame[DATE])
+    wanted = pd.DatetimeIndex(pd.to_datetime(keys_frame[DATE])).normalize().unique()
+    if not pd.api.types.is_datetime64_any_dtype(days):
+        wanted = wanted.date
+    candidates = np.flatnonzero(days.isin(wanted).to_numpy())
+    if len(candidates):
+        part = frame.iloc[candidates]
+        mask[candidates] = _key_index(part, keys).isin(_key_index(keys_frame, keys))
+    return mask
+
+
+def _replace(frame, mask, new, order):
+    parts = [p for p in (frame[~mask], new) if len(p)]
+    if not parts:
+        return new
+    categorical = [c for c in _CATEGORICAL if c in new and isinstance(new[c].dtype, pd.CategoricalDtype)]
+    result = concat_frames(parts, categorical)
+    return result.sort_values(order, kind="stable").reset_index(drop=True)
+
+
+def append(store, df, segments):
+    """Дозагрузка выгрузки: (новое состояние, затронутые ячейки оборудование-смена-день).
+
+    Записи без даты или оборудования в показатели не входят и не сохраняются.
+    """
+    reduced = reduce_records(df, segments)
+    reduced = reduced[reduced[DATE].notna() & reduced[EQUIPMENT].notna()].reset_index(drop=True)
+    batch = build_cube(reduced)
+    touched = batch[REPLACE_KEYS].drop_duplicates().reset_index(drop=True)
+    if touched.empty:
+        return store, touched
+    days = touched[DAY_KEYS].drop_duplicates()
+
+    cube = _replace(store["cube"], _matches(store["cube"], touched, REPLACE_KEYS), batch, DAY_KEYS)
+    # Ккф по (оборудование, день) - из всех смен дня, включая не затронутые;
+    # ячейки Кисвр затронутых ключей целиком из новой выгрузки
+    new_kkf = cube_kkf(cube[_matches(cube, days, DAY_KEYS)])
+    new_kisvr = cube_kisvr(batch)
+    old_kkf = _matches(store["kkf"], days, DAY_KEYS)
+    old_kisvr = _matches(store["kisvr"], touched, REPLACE_KEYS)
+
+    totals = _combine(store["totals"], table_totals(store["kkf"][old_kkf], store["kisvr"][old_kisvr]), -1)
+    totals = _combine(totals, table_totals(new_kkf, new_kisvr), 1)
+
+    records = store["records"]
+    return {
+        "records": _replace(records, _matches(records, touched, REPLACE_KEYS), reduced, [DATE]),
+        "cube": cube,
+        "kkf": _replace(store["kkf"], old_kkf, new_kkf, DAY_KEYS),
+        "kisvr": _replace(store["kisvr"], old_kisvr, new_kisvr, REPLACE_KEYS),
+        "totals": totals,
+    }, touched
+
+
+def _write(frame, path):
+    # Через временный файл: прерванная запись не портит историю
+    frame.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def save_store(store, root, touched):
+    """Сохраняет состояние после append: переписываются только затронутые дни записей."""
+    os.makedirs(os.path.join(root, RECORDS_DIR), exist_ok=True)
+    records = store["records"]
+    record_days = pd.DatetimeIndex(records[DATE]).normalize()
+    for day in pd.DatetimeIndex(touched[DATE]).normalize().unique():
+        _write(records[record_days == day], os.path.join(root, RECORDS_DIR, f"{day.date()}.parquet"))
+    for name in TABLES:
+        _write(store[name], os.path.join(root, f"{name}.parquet"))
+    with open(os.path.join(root, TOTALS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(store["totals"], f, ensure_ascii=False)
+    os.replace(os.path.join(root, TOTALS_FILE + ".tmp"), os.path.join(root, TOTALS_FILE))
+
+
+def load_store(root):
+    """Состояние из каталога root (пустое, если истории ещё нет)."""
+    if not os.path.exists(os.path.join(root, TOTALS_FILE)):
+        return empty_store()
+    store = {name: pd.read_parquet(os.path.join(root, f"{name}.parquet")) for name in TABLES}
+    records_dir = os.path.join(root, RECORDS_DIR)
+    frames = [
+        pd.read_parquet(os.path.join(records_dir, name))
+        for name in sorted(os.listdir(records_dir)) if name.endswith(".parquet")
+    ]
+    frames = [f for f in frames if len(f)]
+    store["records"] = concat_frames(frames, _CATEGORICAL) if frames else empty_store()["records"]
+    if "records" in store["cube"]:
+        # Куб прежнего формата (часы по записям) - заново из записей
+        store["cube"] = build_cube(store["records"]) if frames else empty_store()["cube"]
+    with open(os.path.join(root, TOTALS_FILE), encoding="utf-8") as f:
+        store["totals"] = json.load(f)
+    return store
@@ -0,0 +1,225 @@
+import codecs
+import json
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from analytics.compact import SegmentStore, same_categories
+from analytics.kpi import (
+    DATE, DIMENSIONS, DURATION_COL, ENGINE_COL, USAGE_COL, explode_segments,
+)
+from analytics.profiling import stage
+
+SEGMENT_COLUMNS = [DURATION_COL, ENGINE_COL, USAGE_COL]
+
+# С какого размера загрузки потоковый режим включается по умолчанию
+STREAMING_THRESHOLD = 200 * 1024 * 1024
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_records(fileobj, read_size=1 << 20):
+    """Выдаёт элементы JSON-массива верхнего уровня по одному.
+
+    Документ целиком в память не загружается: читаем блоками по read_size
+    байт и разбираем элементы json.JSONDecoder.raw_decode по мере поступления.
+    Объект верхнего уровня (не массив) выдаётся как единственная запись.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fileobj.read(read_size)
+        eof = not chunk
+        buf = buf[pos:] + text.decode(chunk or b"", final=eof)
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    def value():
+        nonlocal pos
+        while True:
+            try:
+                record, pos = decoder.raw_decode(buf, pos)
+                return record
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+
+    def end():
+        # После документа допустимы только пробельные символы, как в json.load
+        skip(_WHITESPACE)
+        if pos < len(buf):
+            raise ValueError("Некорректный JSON: лишние данные после документа")
+
+    skip(_WHITESPACE)
+    if pos >= len(buf):
+        return
+    if buf[pos] != "[":
+        # Одиночный объект: разбираем как есть
+        while not eof:
+            fill()
+        record = value()
+        end()
+        yield record
+        return
+
+    pos += 1
+    skip(_WHITESPACE)
+    if pos < len(buf) and buf[pos] == "]":
+        pos += 1
+        end()
+        return
+    while True:
+        skip(_WHITESPACE)
+        if pos >= len(buf):
+            raise ValueError("Некорректный JSON: массив не закрыт")
+        if buf[pos] in ",]":
+            raise ValueError("Некорректный JSON: пропущен элемент массива")
+        yield value()
+        skip(_WHITESPACE)
+        if pos >= len(buf):
+            raise ValueError("Некорректный JSON: массив не закрыт")
+        if buf[pos] == "]":
+            pos += 1
+            end()
+            return
+        if buf[pos] != ",":
+            raise ValueError("Некорректный JSON: между элементами массива нужна запятая")
+        pos += 1
+
+
+def parse_dates(values):
+    """Даты записей; дата с часовым поясом ("...+03:00") - местное время
+    выгрузки без пояса, как .dt.date в прежнем расчёте."""
+    dates = pd.to_datetime(values, errors="coerce")
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates
+
+
+def _build_chunk(records, seconds):
+    # Только нужные дашборду колонки; списки участков сразу в компактные массивы
+    columns = {c: [r.get(c) for r in records] for c in DIMENSIONS + SEGMENT_COLUMNS}
+    segments = SegmentStore.from_frame(
+        explode_segments(pd.DataFrame(columns), seconds), len(records)
+    )
+    frame = pd.DataFrame({
+        DATE: parse_dates(pd.Series(columns[DATE], dtype=object)),
+        **{c: pd.Categorical(columns[c]) for c in DIMENSIONS if c != DATE},
+    })
+    return frame, segments
+
+
+def concat_frames(frames, categorical):
+    if not frames:
+        return pd.DataFrame()
+    result = pd.concat(frames, ignore_index=True)
+    # concat теряет categorical при разных наборах категорий
+    for column in categorical:
+        result[column] = union_categoricals(
+            same_categories([pd.Categorical(f[column]) for f in frames]), ignore_order=True
+        )
+    return result
+
+
+def load_json(fileobj, streaming=False, seconds=False):
+    """Загрузка выгрузки: (записи, участки compact.SegmentStore).
+
+    Некорректный JSON - ValueError. seconds=True - продолжительности
+    участков с учётом секунд. В записях, как и при потоковой загрузке, только
+    измерения: списки участков для просмотра - with_segments.
+    """
+    fileobj.seek(0)
+    if streaming:
+        with stage("Потоковый разбор JSON") as info:
+            df, segments = load_streaming(fileobj, seconds=seconds)
+            info.update(rows=len(df), segments=len(segments))
+        return df, segments
+
+    with stage("Разбор JSON") as info:
+        data = json.load(fileobj)
+        if not isinstance(data, (dict, list)):
+            raise ValueError("Некорректный формат JSON")
+        # Только нужные колонки, пропущенные - пустые, как r.get в потоковом разборе
+        df = pd.json_normalize(data).reindex(columns=DIMENSIONS + SEGMENT_COLUMNS)
+        info["rows"] = len(df)
+    with stage("Участки", rows=len(df)) as info:
+        segments = SegmentStore.from_frame(explode_segments(df, seconds), len(df))
+        info.update(segments=len(segments), segments_mb=round(segments.nbytes / 1024 / 1024, 1))
+    # Списки участков не остаются в записях рядом с SegmentStore
+    df = df[DIMENSIONS].copy()
+    with stage("pd.to_datetime", rows=len(df)):
+        df[DATE] = parse_dates(df[DATE])
+        for column in DIMENSIONS[1:]:
+            df[column] = df[column].astype("category")
+    return df, segments
+
+
+def with_segments(df, segments, positions):
+    """Записи positions со списками участков (колонки исходного JSON) для
+    таблицы записей: списки собираются из SegmentStore только для показа.
+
+    Продолжительность - "0001-01-01Tчч:мм:сс" с той точностью, с которой
+    она загружена (без учёта секунд - с нулевыми секундами).
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    starts, stops = segments.offsets[positions], segments.offsets[positions + 1]
+    lengths = stops - starts
+    # Позиции участков выбранных записей подряд
+    index = np.repeat(stops - np.cumsum(lengths), lengths) + np.arange(int(lengths.sum()))
+    if segments.unit is None:
+        total = np.rint(segments.hours()[index] * 3600).astype(np.int64)
+    else:
+        total = segments.durations[index].astype(np.int64) * (3600 // segments.unit)
+    durations = [
+        f"0001-01-01T{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in total.tolist()
+    ]
+    bounds = np.cumsum(lengths)[:-1]
+
+    def split(values):
+        return [list(part) for part in np.split(np.asarray(values, dtype=object), bounds)] if len(positions) else []
+
+    shown = df.take(positions).reset_index(drop=True)
+    shown[DURATION_COL] = split(durations)
+    shown[ENGINE_COL] = split(segments.engine()[index].tolist())
+    shown[USAGE_COL] = split(segments.usage()[index])
+    return shown
+
+
+def load_streaming(fileobj, chunk_records=5_000, seconds=False):
+    """Потоковая загрузка: (записи, участки) без промежуточного DataFrame со списками.
+
+    Записи содержат только Дата, Смена, Оборудование, Топливо (categorical),
+    участки - compact.SegmentStore. Пиковая память определяется размером
+    результата и одного блока из chunk_records записей.
+    """
+    record_frames, segment_stores = [], []
+    batch = []
+    for record in iter_json_records(fileobj):
+        if not isinstance(record, dict):
+            raise ValueError("Некорректный формат JSON")
+        batch.append(record)
+        if len(batch) >= chunk_records:
+            frame, segments = _build_chunk(batch, seconds)
+            record_frames.append(frame)
+            segment_stores.append(segments)
+            batch = []
+    if batch or not record_frames:
+        frame, segments = _build_chunk(batch, seconds)
+        record_frames.append(frame)
+        segment_stores.append(segments)
+
+    df = concat_frames(record_frames, [c for c in DIMENSIONS if c != DATE])
+    return df, SegmentStore.concat(segment_stores)
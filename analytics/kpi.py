@@ -0,0 +1,175 @@
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from analytics.durations import decode_hours
+from analytics.rules import read_rules
+
+# Колонки исходного JSON
+DATE = "Дата"
+SHIFT = "Смена"
+EQUIPMENT = "Оборудование"
+FUEL = "Топливо"
+DURATION_COL = "ПоказателиОборудованияПоУчасткамПродолжительность"
+ENGINE_COL = "ПоказателиОборудованияПоУчасткамВключенДвигатель"
+USAGE_COL = "ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени"
+
+DIMENSIONS = [DATE, SHIFT, EQUIPMENT, FUEL]
+
+SHIFTS = ["1 смена (07-19)", "2 смена (19-07)"]
+
+# Колонки итоговых таблиц
+COL_TK = "Календарный фонд (Тк), ч"
+COL_TPL = "Плановый фонд (Тпл), ч"
+COL_TF = "Фактическое время работы (Тф), ч"
+COL_TPPR = "Время ППР (Тппр), ч"
+COL_KKF = "Коэф. использования календарного фонда (Ккф)"
+COL_KIO = "Коэф. использования рабочего фонда (Кио)"
+COL_KTG = "Коэф. технической готовности (Ктг)"
+COL_TSM = "Суммарное время (Тсм), ч"
+COL_TSMF = "Рабочее время в смене (Тсмф), ч"
+COL_TCHSM = "Чистое время работы в смену (Тчсм), ч"
+COL_KISVR = "Коэф. использования по времени (Кисвр)"
+
+# Колонки таблиц, которые читают средние, сглаживание и накопленная история:
+# таблица правил обязана их задавать
+REQUIRED_COLUMNS = {
+    "kkf": [COL_TPL, COL_TPPR, COL_KKF, COL_KIO, COL_KTG],
+    "kisvr": [COL_TCHSM, COL_KISVR],
+}
+
+# Регламент: суммы времени по видам использования и формулы показателей
+# (analytics/rules.json или файл из DV_RULES)
+RULES = read_rules(os.environ.get("DV_RULES"), REQUIRED_COLUMNS)
+
+# Аддитивные суммы времени (ч), из которых считаются все коэффициенты
+BUCKETS = RULES.buckets
+
+T_KL = RULES.constants["T_kl"]  # календарный фонд за день
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else []
+
+
+def explode_segments(df, seconds=False):
+    """Разворачивает списки участков в плоскую таблицу сегментов.
+
+    rec - позиция записи в df, hours - продолжительность в часах
+    (seconds=True - с учётом секунд), engine - двигатель включен,
+    usage - вид использования (categorical).
+    """
+    durations = [_as_list(v) for v in df[DURATION_COL]]
+    engines = [_as_list(v) for v in df[ENGINE_COL]]
+    usages = [_as_list(v) for v in df[USAGE_COL]]
+
+    lengths = np.fromiter(map(len, durations), dtype=np.int64, count=len(durations))
+    total = int(lengths.sum())
+
+    # Как и zip() в расчёте: лишние признаки отбрасываются, недостающие не учитываются
+    if any(len(e) != n for e, n in zip(engines, lengths)):
+        engines = [(e + [False] * n)[:n] for e, n in zip(engines, lengths)]
+    if any(len(u) != n for u, n in zip(usages, lengths)):
+        usages = [(u + [None] * n)[:n] for u, n in zip(usages, lengths)]
+
+    return pd.DataFrame({
+        "rec": np.repeat(np.arange(len(df), dtype=np.int64), lengths),
+        "hours": decode_hours(list(itertools.chain.from_iterable(durations)), seconds),
+        "engine": np.fromiter(itertools.chain.from_iterable(engines), dtype=bool, count=total),
+        "usage": pd.Categorical(list(itertools.chain.from_iterable(usages))),
+    })
+
+
+def segment_arrays(segments):
+    """rec, hours, engine, usage из таблицы сегментов или compact.SegmentStore."""
+    if isinstance(segments, pd.DataFrame):
+        return (
+            segments["rec"].to_numpy(), segments["hours"].to_numpy(),
+            segments["engine"].to_numpy(), segments["usage"].array,
+        )
+    return segments.arrays()
+
+
+def record_partials(segments, n_records):
+    """Суммы времени по видам (BUCKETS) для каждой записи, один проход по участкам."""
+    rec, hours, engine, usage = segment_arrays(segments)
+    return pd.DataFrame(RULES.bucket_sums(rec, hours, engine, usage, n_records), columns=BUCKETS)
+
+
+def reduce_records(df, segments=None):
+    """Измерения записей + суммы времени по видам, индекс совпадает с df."""
+    if segments is None:
+        segments = explode_segments(df)
+    partials = record_partials(segments, len(df))
+    partials.index = df.index
+    return pd.concat([df[DIMENSIONS], partials], axis=1)
+
+
+def _round(values, ndigits):
+    # Результат - как у round() Python в прежнем расчёте. np.round ошибается
+    # только рядом с половиной, поэтому такие значения - через round()
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    result = np.round(scaled) / scale
+    near = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    result[near] = [round(v, ndigits) for v in values[near].tolist()]
+    return result
+
+
+def _plain(values):
+    # Измерения могут быть categorical; в итоговых таблицах - обычные значения
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.cat.categories.dtype)
+    return values
+
+
+def kkf_table(sums):
+    """Ккф, Тпл, Кио, Ктг из сумм по (Оборудование, Дата)."""
+    index = sums.index.to_frame(index=False)
+    return pd.DataFrame({
+        EQUIPMENT: _plain(index[EQUIPMENT]),
+        DATE: index[DATE],
+        **RULES.evaluate(RULES.kkf, sums, _round),
+    })
+
+
+def kisvr_table(sums):
+    """Кисвр и Тчсм из сумм по (Оборудование, Смена, Дата)."""
+    index = sums.index.to_frame(index=False)
+    return pd.DataFrame({
+        EQUIPMENT: _plain(index[EQUIPMENT]),
+        SHIFT: _plain(index[SHIFT]),
+        DATE: index[DATE],
+        **RULES.evaluate(RULES.kisvr, sums, _round),
+    })
+
+
+def group_sums(reduced, keys, dropna=True):
+    """Суммы BUCKETS по группам keys (группы отсортированы, как в groupby).
+
+    Складываем bincount-ом по порядку записей, а не groupby().sum():
+    тот суммирует с компенсацией и расходится с прежним расчётом в последнем бите.
+    """
+    grouped = reduced.groupby(keys, sort=True, observed=True, dropna=dropna)
+    codes = grouped.ngroup()
+    # Строки с пропусками в ключах ни в одну группу не входят (ngroup = NaN)
+    valid = codes.notna().to_numpy()
+    codes = codes.to_numpy()[valid].astype(np.int64)
+    index = grouped.size().index
+    return pd.DataFrame({
+        b: np.bincount(codes, weights=reduced[b].to_numpy()[valid], minlength=len(index))
+        for b in BUCKETS
+    }, index=index)
+
+
+def compute_kkf(reduced):
+    day = reduced[DATE].dt.date.rename(DATE)
+    return kkf_table(group_sums(reduced, [reduced[EQUIPMENT], day]))
+
+
+def compute_kisvr(reduced):
+    day = reduced[DATE].dt.date.rename(DATE)
+    return kisvr_table(group_sums(reduced, [reduced[EQUIPMENT], reduced[SHIFT], day]))
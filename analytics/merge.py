@@ -0,0 +1,126 @@
+"""Несколько выгрузок: разбор в отдельных процессах и слияние по мере готовности."""
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from analytics.cube import CELL_KEYS, UNITS, build_cube, sum_cells
+from analytics.ingest import concat_frames, load_json
+from analytics.kpi import (
+    BUCKETS, COL_KISVR, COL_KKF, DATE, DIMENSIONS, EQUIPMENT, SHIFT,
+    kisvr_table, kkf_table, reduce_records,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Предварительные средние: колонка -> (ключи строк таблицы, таблица)
+PREVIEW = {
+    COL_KKF: ([EQUIPMENT, DATE], kkf_table),
+    COL_KISVR: ([EQUIPMENT, SHIFT, DATE], kisvr_table),
+}
+
+
+def worker_pool():
+    """Общий пул процессов (spawn: fork из многопоточного сервера небезопасен)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def reduce_source(source, seconds=False):
+    """Разбор одной выгрузки (путь или байты): (записи, куб)."""
+    fileobj = open(source, "rb") if isinstance(source, str) else io.BytesIO(source)
+    with fileobj:
+        df, segments = load_json(fileobj, streaming=True, seconds=seconds)
+    return df, build_cube(reduce_records(df, segments))
+
+
+def spool(fileobj):
+    """Копия загруженного файла во временном файле: исполнителям передаётся
+    путь, а не содержимое в памяти и в pickle. Файл удаляет вызывающий."""
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile("wb", prefix="dv-upload-", suffix=".json", delete=False) as f:
+        shutil.copyfileobj(fileobj, f, 8 * 1024 * 1024)
+    return f.name
+
+
+def merge_cubes(cubes):
+    """Куб нескольких выгрузок: одинаковые ячейки складываются."""
+    return sum_cells(concat_frames(list(cubes), [c for c in CELL_KEYS if c != DATE]))
+
+
+def merge_results(results):
+    """Слияние результатов reduce_source: (записи, куб)."""
+    results = list(results)
+    df = concat_frames([r[0] for r in results], [c for c in DIMENSIONS if c != DATE])
+    return df, merge_cubes(r[1] for r in results)
+
+
+class RunningAverages:
+    """Предварительные средние Ккф и Кисвр по мере готовности файлов.
+
+    Суммы ячеек копятся по ключам строк таблиц: файл пересчитывает только
+    строки своих ключей, а среднее - по накопленной сумме значений (целыми
+    тысячными), без повторной склейки уже готовых файлов.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self._sums = {column: {} for column in PREVIEW}
+        self._values = {column: {} for column in PREVIEW}
+        self._totals = dict.fromkeys(PREVIEW, 0)
+
+    def add(self, result):
+        df, cube = result
+        self.records += len(df)
+        for column, (keys, table) in PREVIEW.items():
+            sums, values = self._sums[column], self._values[column]
+            part = cube.groupby(keys, sort=False, observed=True)[BUCKETS].sum()
+            for key, row in zip(part.index, part.to_numpy()):
+                sums[key] = row if key not in sums else sums[key] + row
+            touched = pd.DataFrame(
+                [sums[key] for key in part.index], index=part.index, columns=BUCKETS,
+            ) / UNITS
+            scaled = np.rint(table(touched)[column].to_numpy() * 1000).astype(np.int64)
+            for key, value in zip(part.index, scaled.tolist()):
+                self._totals[column] += value - values.get(key, 0)
+                values[key] = value
+
+    def mean(self, column):
+        rows = len(self._values[column])
+        return self._totals[column] / rows / 1000 if rows else float("nan")
+
+
+def iter_reduced(sources, seconds=False, pool=None):
+    """Запускает reduce_source для {ключ: источник}, выдаёт (ключ, результат или исключение)
+    в порядке готовности."""
+    pool = pool or worker_pool()
+    futures = {pool.submit(reduce_source, source, seconds): key for key, source in sources.items()}
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result()
+        except Exception as exc:
+            yield futures[future], exc
+
+
+def scan_directory(path):
+    """JSON-файлы каталога: {(путь, mtime, размер): путь}."""
+    files = {}
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if name.lower().endswith(".json") and os.path.isfile(full):
+            stat = os.stat(full)
+            files[(full, stat.st_mtime_ns, stat.st_size)] = full
+    return files
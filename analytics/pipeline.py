@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from analytics.cube import build_cube, cube_kisvr, cube_kkf, slice_cube
+from analytics.kpi import (
+    COL_KIO, COL_KISVR, COL_KKF, COL_KTG, COL_TCHSM, COL_TPL, COL_TPPR,
+    DATE, EQUIPMENT, FUEL, SHIFT, SHIFTS, T_KL, reduce_records,
+)
+
+
+def filter_key(period, shifts, equipment, fuels):
+    """Нормализованное состояние фильтров (ключ кэша)."""
+    return (
+        tuple(period) if len(period) == 2 else None,
+        tuple(sorted(map(str, shifts))),
+        tuple(sorted(map(str, equipment))),
+        tuple(sorted(map(str, fuels))),
+    )
+
+
+def filter_positions(df, period=(), shifts=(), equipment=(), fuels=()):
+    """Позиции записей df, прошедших фильтры боковой панели (массив индексов)."""
+    mask = np.ones(len(df), dtype=bool)
+    if len(period) == 2:
+        start, end = period
+        dates = df[DATE]
+        mask &= ((dates >= pd.Timestamp(start)) & (dates < pd.Timestamp(end + timedelta(days=1)))).to_numpy()
+    if shifts:
+        mask &= df[SHIFT].isin(shifts).to_numpy()
+    if equipment:
+        mask &= df[EQUIPMENT].isin(equipment).to_numpy()
+    if fuels:
+        mask &= df[FUEL].isin(fuels).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def apply_filters(df, period=(), shifts=(), equipment=(), fuels=()):
+    """Отфильтрованные записи; без фильтров - сам df, без копии."""
+    positions = filter_positions(df, period, shifts, equipment, fuels)
+    return df if len(positions) == len(df) else df.take(positions)
+
+
+def period_averages(kkf_df, kisvr_df, shifts=SHIFTS):
+    """Средние значения за выбранный период (таблицы и метрики)."""
+    # Среднее Ккф по оборудованию
+    avg_kkf = kkf_df.groupby(EQUIPMENT)[COL_KKF].mean().reset_index()
+    avg_kkf = avg_kkf.rename(columns={COL_KKF: "Среднее Ккф"})
+
+    # Среднее Кисвр по сменам
+    avg_kisvr = kisvr_df.groupby([EQUIPMENT, SHIFT])[COL_KISVR].mean().reset_index()
+    avg_kisvr = avg_kisvr.rename(columns={COL_KISVR: "Среднее Кисвр"})
+
+    kisvr_by_shift = {}
+    for shift in shifts:
+        avg_shift = kisvr_df[kisvr_df[SHIFT] == shift][COL_KISVR].mean()
+        kisvr_by_shift[shift] = round(avg_shift, 3) if not pd.isna(avg_shift) else 0
+
+    return {
+        "avg_kkf": avg_kkf,
+        "avg_kisvr": avg_kisvr,
+        "overall_kkf": round(kkf_df[COL_KKF].mean(), 3),
+        "kisvr_by_shift": kisvr_by_shift,
+        "total_ppr": round(kkf_df[COL_TPPR].sum(), 2),
+        "avg_tpl": round(kkf_df[COL_TPL].mean(), 2),
+        "avg_chsm": round(kisvr_df[COL_TCHSM].mean(), 2),
+        "avg_kio": round(kkf_df[COL_KIO].mean(), 3),
+        "avg_ktg": round(kkf_df[COL_KTG].mean(), 3),
+    }
+
+
+def calendar_fund(df, period=()):
+    """Календарный фонд времени Тк за период (или за все дни выгрузки), ч."""
+    if len(period) == 2:
+        start, end = period
+    else:
+        start, end = df[DATE].min(), df[DATE].max()
+        if pd.isna(start):
+            return 0
+        start, end = start.date(), end.date()
+    return ((end - start).days + 1) * T_KL
+
+
+def compute_kpi(df, segments, period=(), shifts=(), equipment=(), fuels=()):
+    """Полный расчёт без Streamlit: (kkf_df, kisvr_df, средние за период)."""
+    cube = build_cube(reduce_records(df, segments))
+    cells = slice_cube(cube, period, shifts, equipment, fuels)
+    kkf_df, kisvr_df = cube_kkf(cells), cube_kisvr(cells)
+    return kkf_df, kisvr_df, period_averages(kkf_df, kisvr_df)
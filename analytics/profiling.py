@@ -0,0 +1,123 @@
+"""Замер времени и памяти по этапам расчёта (включается по желанию).
+
+Этапы отмечаются через stage(): пока профилировщик не активирован, это
+пустые операции, поэтому замеры можно оставлять в коде модулей.
+
+    profiler = Profiler()
+    activate(profiler)
+    with stage("Разбор JSON") as info:
+        ...
+        info["rows"] = len(df)
+"""
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+_active = contextvars.ContextVar("profiler", default=None)
+# Вложенность этапов - своя в каждом потоке: фоновая задача получает копию
+# контекста скрипта (background.Jobs.submit), и её этапы вложены в этап,
+# из которого она запущена, а не в этапы других потоков
+_depth = contextvars.ContextVar("profiler_depth", default=0)
+
+MB = 1024 * 1024
+
+
+def peak_mb():
+    """Пиковый объём памяти процесса с его запуска, МБ; None, если узнать нельзя."""
+    if resource is None:
+        return None
+    # ru_maxrss в КБ на Linux, в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def rss_mb():
+    """Текущий объём памяти процесса (RSS), МБ; где /proc нет - пиковый."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        return peak_mb()
+
+
+class Profiler:
+    """Список этапов одного запуска: время, память и счётчики строк/участков."""
+
+    def __init__(self):
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, **counts):
+        info = dict(counts)
+        depth = _depth.get()
+        entry = {"stage": name, "depth": depth}
+        self.stages.append(entry)
+        token = _depth.set(depth + 1)
+        before = rss_mb()
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 6)
+            after = rss_mb()
+            if after is not None:
+                entry["rss_mb"] = round(after, 1)
+                entry["rss_delta_mb"] = round(after - before, 1)
+            peak = peak_mb()
+            if peak is not None:
+                # Пик с начала процесса: этап, на котором он вырос, и задаёт требования к памяти
+                entry["peak_mb"] = round(peak, 1)
+            entry.update(info)
+            _depth.reset(token)
+
+    def frame(self):
+        frame = pd.DataFrame(self.stages)
+        if not frame.empty:
+            # Вложенные этапы - с отступом, время вложенных уже входит во внешний
+            frame["stage"] = ["  " * d + s for d, s in zip(frame["depth"], frame["stage"])]
+            frame = frame.drop(columns="depth")
+        return frame
+
+    def total_seconds(self):
+        return sum(s.get("seconds", 0) for s in self.stages if s["depth"] == 0)
+
+    def jsonl(self, **context):
+        """Этапы строками JSON (одна строка на этап) с общими полями запуска."""
+        return "".join(
+            json.dumps({"run": self.started, **context, **entry}, ensure_ascii=False, default=str) + "\n"
+            for entry in self.stages
+        )
+
+    def write_jsonl(self, path, **context):
+        """Дописывает этапы запуска в файл path (JSON lines)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.jsonl(**context))
+
+
+def activate(profiler):
+    """Профилировщик для этапов текущего потока (None - замеры выключены)."""
+    _active.set(profiler)
+
+
+@contextmanager
+def stage(name, **counts):
+    profiler = _active.get()
+    if profiler is None:
+        yield dict(counts)
+        return
+    with profiler.stage(name, **counts) as info:
+        yield info
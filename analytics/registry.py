@@ -0,0 +1,281 @@
+"""Реестр выгрузок, общий для всех сессий процесса.
+
+Одна и та же выгрузка (тот же ключ набора данных, т.е. хэш содержимого)
+хранится один раз: записи, куб и таблицы Ккф и Кисвр без фильтров
+записываются по колонкам в .npy и открываются через np.memmap только для
+чтения. Числовые колонки, даты и коды categorical не занимают память
+процесса сверх страничного кэша ОС; строковые и объектные колонки (даты
+таблиц показателей) - одна копия в памяти на выгрузку. Вместе с таблицами
+хранятся ошибки разбора файлов выгрузки: они показываются и после
+перезапуска сервера, когда выгрузка открывается с диска без разбора.
+
+Сессии захватывают выгрузку (acquire) и отпускают её при переходе к другой
+(release). Выгрузка без сессий дольше idle_seconds вытесняется: каталог
+удаляется. Сессия, которая не обращалась к реестру дольше session_seconds,
+считается закрытой. Каталоги, оставшиеся от прежних процессов, без
+обращений дольше idle_seconds удаляются при создании реестра (sweep).
+Имя каталога зависит от версии формата и регламента (RULES.digest).
+
+    registry = shared_registry()
+    dataset = registry.acquire(owner, dataset_key, lambda: (df, cube))
+    dataset.df, dataset.cube, dataset.kkf, dataset.kisvr, dataset.errors
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from analytics.cube import cube_kisvr, cube_kkf
+from analytics.kpi import RULES
+
+DEFAULT_ROOT = "data/registry"
+# Выгрузка без сессий вытесняется через, с (переменная окружения DV_REGISTRY_IDLE)
+DEFAULT_IDLE_SECONDS = 600
+# Сессия без обращений дольше, с, не удерживает выгрузки
+SESSION_SECONDS = 3600
+
+FRAMES = ["df", "cube", "kkf", "kisvr"]
+META_FILE = "meta.json"
+ERRORS_FILE = "errors.json"
+# Версия формата каталога выгрузки: входит в имя каталога вместе с регламентом
+FORMAT_VERSION = 2
+
+
+def dataset_digest(key):
+    """Имя каталога выгрузки по ключу набора данных, формату и регламенту
+    (после смены DV_RULES или rules.json сохранённые таблицы не подходят)."""
+    full = (FORMAT_VERSION, RULES.digest, key)
+    return hashlib.blake2b(repr(full).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _write_frame(frame, path):
+    os.makedirs(path)
+    columns = []
+    for i, name in enumerate(frame.columns):
+        values = frame[name]
+        column = {"name": name, "file": f"{i}.npy"}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            column["kind"] = "category"
+            column["ordered"] = bool(values.cat.ordered)
+            categories = values.cat.categories
+            if categories.dtype.kind not in "biufM":
+                # Строковые категории - массивом unicode, без pickle
+                categories = categories.astype(str).to_numpy(dtype=str)
+            np.save(os.path.join(path, f"{i}.categories.npy"), np.asarray(categories), allow_pickle=False)
+            np.save(os.path.join(path, column["file"]), values.array.codes)
+        elif values.dtype.kind == "M" and isinstance(values.dtype, np.dtype):
+            column["kind"] = "datetime"
+            column["dtype"] = str(values.dtype)
+            np.save(os.path.join(path, column["file"]), values.to_numpy().view(np.int64))
+        elif isinstance(values.dtype, np.dtype) and values.dtype.kind in "biuf":
+            column["kind"] = "numeric"
+            np.save(os.path.join(path, column["file"]), values.to_numpy())
+        else:
+            # Строки и объекты отобразить в память нельзя - хранятся целиком
+            column["kind"] = "object"
+            column["file"] = f"{i}.pkl"
+            values.reset_index(drop=True).to_pickle(os.path.join(path, column["file"]))
+        columns.append(column)
+    with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"rows": len(frame), "columns": columns}, f, ensure_ascii=False)
+
+
+def _read_frame(path):
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    data = {}
+    for column in meta["columns"]:
+        file = os.path.join(path, column["file"])
+        if column["kind"] == "object":
+            data[column["name"]] = pd.read_pickle(file)
+            continue
+        values = np.load(file, mmap_mode="r")
+        if column["kind"] == "category":
+            categories = pd.Index(np.load(os.path.join(path, f"{column['file'][:-4]}.categories.npy")))
+            # from_codes без проверки не копирует коды
+            values = pd.Categorical.from_codes(
+                values, dtype=pd.CategoricalDtype(categories, column["ordered"]), validate=False,
+            )
+        elif column["kind"] == "datetime":
+            values = values.view(column["dtype"])
+        data[column["name"]] = values
+    return pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]), copy=False)
+
+
+class Dataset:
+    """Выгрузка в реестре: записи, куб и таблицы показателей без фильтров."""
+
+    def __init__(self, digest, path, frames, errors=()):
+        self.digest = digest
+        self.path = path
+        self.df, self.cube, self.kkf, self.kisvr = (frames[name] for name in FRAMES)
+        # Ошибки разбора файлов выгрузки: [(файл, сообщение)]
+        self.errors = [tuple(error) for error in errors]
+        # Сессия -> время последнего обращения
+        self.owners = {}
+        self.last_used = time.monotonic()
+
+    @property
+    def nbytes(self):
+        total = 0
+        for dirpath, _, names in os.walk(self.path):
+            total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in names)
+        return total
+
+
+class Registry:
+    def __init__(self, root=DEFAULT_ROOT, idle_seconds=DEFAULT_IDLE_SECONDS, session_seconds=SESSION_SECONDS):
+        self.root = root
+        self.idle_seconds = idle_seconds
+        self.session_seconds = session_seconds
+        self._datasets = {}
+        self._building = {}
+        self._lock = threading.Lock()
+        self.sweep()
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def acquire(self, owner, key, build):
+        """Выгрузка по ключу для сессии owner; build() -> (записи, куб) или
+        (записи, куб, ошибки разбора [(файл, сообщение)]) - если её ещё нет.
+
+        Прежняя выгрузка сессии отпускается: сессия смотрит одну выгрузку.
+        """
+        digest = dataset_digest(key)
+        with self._lock:
+            self._release(owner, keep=digest)
+            dataset = self._take(owner, digest)
+            if dataset is not None:
+                return dataset
+            building = self._building.setdefault(digest, threading.Lock())
+
+        # Одну выгрузку строит одна сессия, остальные ждут её
+        with building:
+            with self._lock:
+                dataset = self._take(owner, digest)
+            if dataset is None:
+                try:
+                    dataset = self._open(digest, build)
+                except BaseException:
+                    with self._lock:
+                        self._building.pop(digest, None)
+                    raise
+                # Выгрузка в реестре раньше, чем снята блокировка сборки: сессия,
+                # пришедшая между ними, иначе открыла бы каталог второй раз
+                with self._lock:
+                    self._datasets[digest] = dataset
+                    self._building.pop(digest, None)
+                    dataset = self._take(owner, digest)
+        self.evict_idle()
+        return dataset
+
+    def _take(self, owner, digest):
+        dataset = self._datasets.get(digest)
+        if dataset is not None:
+            dataset.owners[owner] = dataset.last_used = time.monotonic()
+            # Время изменения каталога - последнее обращение (для sweep при запуске)
+            try:
+                os.utime(dataset.path)
+            except OSError:
+                pass
+        return dataset
+
+    def _open(self, digest, build):
+        path = os.path.join(self.root, digest)
+        if not os.path.exists(os.path.join(path, FRAMES[-1], META_FILE)):
+            df, cube, *rest = build()
+            errors = rest[0] if rest else []
+            # Во временный каталог, затем переименование: недописанный каталог не откроется
+            tmp = os.path.join(self.root, f".{digest}.{uuid.uuid4().hex}")
+            frames = {"df": df, "cube": cube, "kkf": cube_kkf(cube), "kisvr": cube_kisvr(cube)}
+            try:
+                os.makedirs(tmp)
+                with open(os.path.join(tmp, ERRORS_FILE), "w", encoding="utf-8") as f:
+                    json.dump([list(e) for e in errors], f, ensure_ascii=False)
+                for name in FRAMES:
+                    _write_frame(frames[name], os.path.join(tmp, name))
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            try:
+                os.replace(tmp, path)
+            except OSError:
+                # Каталог уже записан другим процессом
+                shutil.rmtree(tmp, ignore_errors=True)
+        errors = []
+        if os.path.exists(os.path.join(path, ERRORS_FILE)):
+            with open(os.path.join(path, ERRORS_FILE), encoding="utf-8") as f:
+                errors = json.load(f)
+        return Dataset(digest, path, {name: _read_frame(os.path.join(path, name)) for name in FRAMES}, errors)
+
+    def _release(self, owner, keep=None):
+        for digest, dataset in self._datasets.items():
+            if digest != keep and dataset.owners.pop(owner, None) is not None:
+                dataset.last_used = time.monotonic()
+
+    def release(self, owner):
+        """Сессия больше не смотрит выгрузки реестра."""
+        with self._lock:
+            self._release(owner)
+        self.evict_idle()
+
+    def evict_idle(self, now=None):
+        """Вытесняет выгрузки без сессий, простаивающие дольше idle_seconds."""
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            for digest, dataset in list(self._datasets.items()):
+                for owner, seen in list(dataset.owners.items()):
+                    if now - seen > self.session_seconds:
+                        del dataset.owners[owner]
+                if not dataset.owners and now - dataset.last_used > self.idle_seconds:
+                    evicted.append(self._datasets.pop(digest))
+        for dataset in evicted:
+            # Открытые отображения остаются действительными до освобождения объектов
+            shutil.rmtree(dataset.path, ignore_errors=True)
+        return [d.digest for d in evicted]
+
+    def sweep(self, now=None):
+        """Удаляет из каталога реестра выгрузки прежних процессов, к которым не
+        обращались дольше idle_seconds, и недописанные временные каталоги."""
+        now = time.time() if now is None else now
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        removed = []
+        with self._lock:
+            opened = set(self._datasets)
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                idle = now - os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if name not in opened and idle > self.idle_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+        return removed
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_registry():
+    """Общий реестр процесса (каталог DV_REGISTRY_DIR, простой DV_REGISTRY_IDLE секунд)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Registry(
+                os.environ.get("DV_REGISTRY_DIR", DEFAULT_ROOT),
+                int(os.environ.get("DV_REGISTRY_IDLE", DEFAULT_IDLE_SECONDS)),
+            )
+        return _shared
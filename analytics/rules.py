@@ -0,0 +1,220 @@
+"""Таблица правил регламента: виды использования -> суммы времени -> показатели.
+
+Таблица (rules.json рядом с модулем или свой файл JSON/YAML, см. DV_RULES)
+задаёт суммы времени (buckets) условиями на вид использования и признак
+работы двигателя, а колонки таблиц Ккф и Кисвр - формулами от этих сумм.
+При загрузке условия компилируются в таблицу принадлежности
+(код вида использования, двигатель) -> суммы, и все суммы заполняются за
+один проход по участкам, сколько бы их ни было в регламенте.
+
+Формулы - арифметика (+ - * /, скобки, числа) над суммами и константами
+таблицы и функции из FUNCTIONS; разбираются через ast, без eval.
+"""
+import ast
+import hashlib
+import json
+import operator
+import os
+
+import numpy as np
+
+RULES_VERSION = 1
+DEFAULT_RULES = os.path.join(os.path.dirname(__file__), "rules.json")
+
+# Участков в одном куске прохода (границы кусков - по записям)
+CHUNK_SEGMENTS = 1 << 20
+
+
+def ratio(num, den):
+    """num / den, где den > 0, иначе 0."""
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    num, den = np.broadcast_arrays(num, den)
+    out = np.zeros(den.shape, dtype=np.float64)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+FUNCTIONS = {"ratio": ratio, "min": np.minimum, "max": np.maximum}
+
+_BINARY = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_UNARY = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+
+def _check(node, names, formula):
+    """Проверяет, что в формуле только разрешённые конструкции."""
+    if isinstance(node, ast.Expression):
+        _check(node.body, names, formula)
+    elif isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        _check(node.left, names, formula)
+        _check(node.right, names, formula)
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        _check(node.operand, names, formula)
+    elif isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        pass
+    elif isinstance(node, ast.Name):
+        if node.id not in names:
+            raise ValueError(f"Формула {formula!r}: неизвестное имя {node.id!r}")
+    elif (
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS and not node.keywords
+    ):
+        for arg in node.args:
+            _check(arg, names, formula)
+    else:
+        raise ValueError(f"Формула {formula!r}: недопустимое выражение {ast.dump(node)[:60]}")
+
+
+def _evaluate(node, values):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, values)
+    if isinstance(node, ast.BinOp):
+        return _BINARY[type(node.op)](_evaluate(node.left, values), _evaluate(node.right, values))
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY[type(node.op)](_evaluate(node.operand, values))
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return values[node.id]
+    return FUNCTIONS[node.func.id](*(_evaluate(arg, values) for arg in node.args))
+
+
+def _record_chunks(rec, size):
+    # Запись целиком попадает в один кусок, поэтому суммы складываются в том
+    # же порядке, что и за один bincount по всем участкам
+    n = len(rec)
+    if n <= size or np.any(rec[1:] < rec[:-1]):
+        return [(0, n)]
+    bounds = [0]
+    while bounds[-1] < n:
+        stop = bounds[-1] + size
+        if stop >= n:
+            bounds.append(n)
+        else:
+            bound = int(np.searchsorted(rec, rec[stop], side="left"))
+            if bound <= bounds[-1]:
+                # Запись длиннее куска - кусок до её конца
+                bound = int(np.searchsorted(rec, rec[stop], side="right"))
+            bounds.append(bound)
+    return list(zip(bounds, bounds[1:]))
+
+
+class Rules:
+    """Скомпилированная таблица правил."""
+
+    def __init__(self, table, source=None, required=None):
+        if not isinstance(table, dict):
+            raise ValueError(f"Таблица правил {source or ''} пуста или не является словарём")
+        if table.get("version") != RULES_VERSION:
+            raise ValueError(
+                f"Версия таблицы правил {table.get('version')!r} не поддерживается (нужна {RULES_VERSION})"
+            )
+        self.source = source
+        self.regulation = table.get("regulation", "")
+        # Отпечаток содержимого таблицы: сохранённые расчёты по другому регламенту не подходят
+        self.digest = hashlib.blake2b(
+            json.dumps(table, sort_keys=True, ensure_ascii=False).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        self.constants = dict(table.get("constants", {}))
+        if "T_kl" not in self.constants:
+            raise ValueError("В таблице правил нет константы T_kl (календарный фонд за день, ч)")
+
+        self.buckets = list(table["buckets"])
+        self._conditions = []
+        for name, spec in table["buckets"].items():
+            unknown = set(spec) - {"title", "usage", "engine"}
+            if unknown:
+                raise ValueError(f"Сумма {name}: неизвестные условия {sorted(unknown)}")
+            usage = spec.get("usage")
+            self._conditions.append((None if usage is None else frozenset(usage), spec.get("engine")))
+
+        names = set(self.buckets) | set(self.constants)
+        self.kkf = self._formulas(table["kkf"], names)
+        self.kisvr = self._formulas(table["kisvr"], names)
+        # Колонки, к которым расчёт обращается по имени (kpi.REQUIRED_COLUMNS)
+        for kind, columns in (required or {}).items():
+            missing = [c for c in columns if c not in table[kind]]
+            if missing:
+                raise ValueError(f"В таблице правил {kind} нет колонок: {', '.join(missing)}")
+
+    @staticmethod
+    def _formulas(columns, names):
+        compiled = []
+        for column, spec in columns.items():
+            tree = ast.parse(spec["formula"], mode="eval")
+            _check(tree, names, spec["formula"])
+            compiled.append((column, tree, spec.get("digits")))
+        return compiled
+
+    def lookup(self, categories):
+        """Таблица принадлежности: строка (код * 2 + двигатель) -> суммы.
+
+        Код вида использования - позиция в categories, пропуск (код -1) -
+        последний, len(categories).
+        """
+        names = list(categories) + [None]
+        table = np.zeros((len(names) * 2, len(self.buckets)), dtype=bool)
+        for code, name in enumerate(names):
+            for engine in (False, True):
+                table[code * 2 + engine] = [
+                    (usage is None or name in usage) and (need is None or bool(need) == engine)
+                    for usage, need in self._conditions
+                ]
+        return table
+
+    def bucket_sums(self, rec, hours, engine, usage, n_records):
+        """Суммы времени (записи x buckets) за один проход по участкам.
+
+        Складываются только пары (участок, сумма) из таблицы принадлежности,
+        по порядку участков - результат совпадает с отдельным bincount по
+        маске на каждую сумму.
+        """
+        width = len(self.buckets)
+        out = np.zeros((n_records, width), dtype=np.float64)
+        if not len(rec):
+            return out
+        table = self.lookup(usage.categories)
+        wrap = len(usage.categories) + 1
+        codes = np.asarray(usage.codes)
+        for start, stop in _record_chunks(rec, CHUNK_SEGMENTS):
+            part = rec[start:stop]
+            key = codes[start:stop].astype(np.int32) % wrap * 2 + engine[start:stop]
+            # Позиции пар в матрице (участок x сумма): участок flat // width, сумма flat % width
+            flat = np.flatnonzero(table[key])
+            seg = flat // width
+            first, last = int(part.min()), int(part.max())
+            sums = np.bincount(
+                flat + (part[seg] - first - seg) * width,
+                weights=hours[start:stop][seg],
+                minlength=(last - first + 1) * width,
+            )
+            out[first:last + 1] += sums.reshape(-1, width)
+        return out
+
+    def evaluate(self, formulas, sums, round_fn):
+        """Колонки таблицы показателей: {колонка: значения} по формулам."""
+        values = dict(self.constants)
+        values.update({b: np.asarray(sums[b], dtype=np.float64) for b in self.buckets})
+        result = {}
+        for column, tree, digits in formulas:
+            value = _evaluate(tree, values)
+            if digits is not None:
+                value = round(value, digits) if np.ndim(value) == 0 else round_fn(value, digits)
+            result[column] = value
+        return result
+
+
+def read_rules(path=None, required=None):
+    """Таблица правил из файла (JSON; YAML - если установлен PyYAML);
+    required - {"kkf" | "kisvr": обязательные колонки}."""
+    path = path or DEFAULT_RULES
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Для таблицы правил в YAML нужен PyYAML: pip install pyyaml") from None
+            table = yaml.safe_load(f)
+        else:
+            table = json.load(f)
+    return Rules(table, source=path, required=required)
@@ -0,0 +1,74 @@
+"""Сглаживание (скользящее среднее по дням) сразу для всех графиков.
+
+Таблица дата x объект (оборудование, смена) хранится по столбцам подряд,
+без пустых ячеек: окно считается по последним window дням, в которые у
+объекта были данные, как rolling(window, min_periods=1) внутри группы.
+Скользящее среднее - через накопленные суммы, сразу для всех показателей.
+"""
+import numpy as np
+
+from analytics.kpi import (
+    COL_KIO, COL_KISVR, COL_KKF, COL_KTG, COL_TCHSM, COL_TPL, DATE, EQUIPMENT, SHIFT,
+)
+
+KKF_METRICS = [COL_KKF, COL_TPL, COL_KIO, COL_KTG]
+KISVR_METRICS = [COL_KISVR, COL_TCHSM]
+
+# Названия сглаженных колонок на графиках
+SMOOTHED = {
+    COL_KKF: "Сглаженное Ккф",
+    COL_TPL: "Сглаженное Тпл",
+    COL_KISVR: "Сглаженное Кисвр",
+    COL_TCHSM: "Сглаженное Тчсм",
+    COL_KIO: "Сглаженный Кио",
+    COL_KTG: "Сглаженный Ктг",
+}
+
+
+def rolling_mean(values, starts, window):
+    """Скользящее среднее по строкам values (n x m) внутри групп.
+
+    starts - номер первой строки группы для каждой строки.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if window <= 1 or not len(values):
+        return values.copy()
+    cumsum = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+    rows = np.arange(len(values))
+    first = np.maximum(rows - window + 1, starts)
+    return (cumsum[rows + 1] - cumsum[first]) / (rows - first + 1)[:, None]
+
+
+def smooth(frame, keys, metrics, window):
+    """Копия frame, отсортированная по keys и дате, со сглаженными колонками metrics."""
+    frame = frame.sort_values(keys + [DATE], kind="stable").reset_index(drop=True)
+    if keys:
+        group = frame.groupby(keys, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    else:
+        group = np.zeros(len(frame), dtype=np.int64)
+    boundary = np.r_[True, group[1:] != group[:-1]][:len(frame)]
+    starts = np.maximum.accumulate(np.where(boundary, np.arange(len(frame)), 0))
+    smoothed = rolling_mean(frame[metrics].to_numpy(), starts, window)
+    for i, column in enumerate(metrics):
+        frame[SMOOTHED[column]] = smoothed[:, i]
+    return frame
+
+
+def smoothing_stage(kkf_df, kisvr_df, window):
+    """Все серии для графиков: средние по дням и по оборудованию.
+
+    average_kkf    - среднее Ккф, Тпл, Кио, Ктг по дням;
+    average_kisvr  - среднее Кисвр по дням и сменам;
+    average_chsm   - среднее Тчсм по дням;
+    equipment_kkf, equipment_kisvr - по оборудованию (и смене).
+    """
+    average_kkf = kkf_df.groupby(DATE)[KKF_METRICS].mean().reset_index()
+    average_kisvr = kisvr_df.groupby([DATE, SHIFT])[[COL_KISVR]].mean().reset_index()
+    average_chsm = kisvr_df.groupby(DATE)[[COL_TCHSM]].mean().reset_index()
+    return {
+        "average_kkf": smooth(average_kkf, [], KKF_METRICS, window),
+        "average_kisvr": smooth(average_kisvr, [SHIFT], [COL_KISVR], window),
+        "average_chsm": smooth(average_chsm, [], [COL_TCHSM], window),
+        "equipment_kkf": smooth(kkf_df, [EQUIPMENT], KKF_METRICS, window),
+        "equipment_kisvr": smooth(kisvr_df, [EQUIPMENT, SHIFT], KISVR_METRICS, window),
+    }
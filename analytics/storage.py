@@ -0,0 +1,191 @@
+"""Архив выгрузок в Parquet: сегменты плоской таблицей, секции по месяцу и оборудованию.
+
+Нужен pyarrow (есть в requirements.txt); без него модуль импортируется,
+но функции сообщают об отсутствии зависимости.
+"""
+import os
+import shutil
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from analytics.compact import SegmentStore
+from analytics.kpi import DATE, DIMENSIONS, EQUIPMENT, FUEL, SHIFT
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:  # pragma: no cover - зависит от окружения
+    pa = ds = fs = None
+
+MONTH = "month"
+SOURCE = "source"
+
+# Записи без участков хранятся одной строкой с нулевой продолжительностью
+SEGMENT_FIELDS = ["rec", "hours", "engine", "usage"]
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Для архива Parquet нужен пакет pyarrow: pip install pyarrow")
+
+
+def _partitioning():
+    return ds.partitioning(
+        pa.schema([(MONTH, pa.string()), (EQUIPMENT, pa.string())]), flavor="hive"
+    )
+
+
+def _names(values):
+    # Секция оборудования - строка; запись без оборудования - null (секция
+    # по умолчанию hive), а не строка "nan"
+    values = values.astype(object)
+    return values.where(values.isna(), values.astype(str)).to_numpy()
+
+
+def to_table(df, segments, source):
+    """Плоская таблица: строка на участок с измерениями своей записи."""
+    _require_pyarrow()
+    if isinstance(segments, SegmentStore):
+        segments = segments.frame()
+    n = len(df)
+    empty = np.setdiff1d(np.arange(n), segments["rec"].to_numpy())
+    rows = pd.concat([
+        segments[SEGMENT_FIELDS],
+        pd.DataFrame({
+            "rec": empty,
+            "hours": np.zeros(len(empty)),
+            "engine": np.zeros(len(empty), dtype=bool),
+            "usage": pd.Categorical([None] * len(empty)),
+        }),
+    ], ignore_index=True)
+    rows["usage"] = rows["usage"].astype("category")
+
+    rec = rows["rec"].to_numpy()
+    records = df[DIMENSIONS].reset_index(drop=True)
+    flat = pd.DataFrame({
+        SOURCE: pd.Categorical([source] * len(rows)),
+        "rec": rec,
+        DATE: records[DATE].to_numpy()[rec],
+        SHIFT: pd.Categorical(records[SHIFT].to_numpy()[rec]),
+        FUEL: pd.Categorical(records[FUEL].to_numpy()[rec]),
+        "hours": rows["hours"].to_numpy(),
+        "engine": rows["engine"].to_numpy(),
+        "usage": rows["usage"],
+        EQUIPMENT: _names(records[EQUIPMENT])[rec],
+        MONTH: records[DATE].dt.strftime("%Y-%m").fillna("unknown").to_numpy()[rec],
+    })
+    # Внутри секции - по дате: статистика групп строк отсекает период
+    flat = flat.sort_values([DATE, "rec"], kind="stable")
+    # categorical -> dictionary в Parquet (словарное кодирование видов и смен)
+    return pa.Table.from_pandas(flat, preserve_index=False)
+
+
+def write_dataset(df, segments, root, name):
+    """Сохраняет выгрузку в root/name; повторная запись заменяет выгрузку целиком.
+
+    Записи читаются по (name, номер записи): секции прежней выгрузки с тем же
+    именем, которых нет в новой, удаляются, иначе её участки смешались бы
+    с новыми записями.
+    """
+    _require_pyarrow()
+    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    ds.write_dataset(
+        to_table(df, segments, name),
+        os.path.join(root, name),
+        format="parquet",
+        partitioning=_partitioning(),
+        existing_data_behavior="overwrite_or_ignore",
+        min_rows_per_group=64 * 1024,
+        max_rows_per_group=256 * 1024,
+    )
+
+
+def open_history(root):
+    """Все выгрузки из каталога root как один набор данных (файлы отображаются в память)."""
+    _require_pyarrow()
+    # Схема секций - та же строковая, что при записи: иначе pyarrow угадывает
+    # тип, и оборудование "007" и "7" читается как одно число 7
+    return ds.dataset(
+        root, format="parquet", partitioning=_partitioning(),
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def fingerprint(root):
+    """Состояние каталога архива (для ключа кэша)."""
+    files = []
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            files.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(files))
+
+
+def history_dimensions(dataset):
+    """Измерения записей архива (для вариантов фильтров)."""
+    table = dataset.to_table(columns=[SOURCE, "rec", DATE, SHIFT, EQUIPMENT, FUEL])
+    frame = table.to_pandas().drop_duplicates([SOURCE, "rec"])
+    frame = frame[DIMENSIONS].reset_index(drop=True)
+    frame[EQUIPMENT] = frame[EQUIPMENT].astype("category")
+    return frame
+
+
+def _months(start, end):
+    months = pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq="M")
+    return [str(m) for m in months]
+
+
+def filter_expression(period=(), shifts=(), equipment=(), fuels=()):
+    """Фильтры боковой панели как выражение pyarrow для чтения с отсечением."""
+    _require_pyarrow()
+    expr = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    if len(period) == 2:
+        start, end = period
+        expr = both(expr, ds.field(MONTH).isin(_months(start, end)))
+        expr = both(expr, ds.field(DATE) >= pd.Timestamp(start))
+        expr = both(expr, ds.field(DATE) < pd.Timestamp(end + timedelta(days=1)))
+    if shifts:
+        expr = both(expr, ds.field(SHIFT).isin([str(s) for s in shifts]))
+    if equipment:
+        expr = both(expr, ds.field(EQUIPMENT).isin([str(e) for e in equipment]))
+    if fuels:
+        expr = both(expr, ds.field(FUEL).isin([str(f) for f in fuels]))
+    return expr
+
+
+def read_history(dataset, period=(), shifts=(), equipment=(), fuels=()):
+    """Чтение архива с фильтрами: (записи, участки) как у ingest.load_json.
+
+    Фильтр по периоду отсекает каталоги месяцев и группы строк по статистике,
+    остальные - каталоги оборудования и строки при сканировании.
+    """
+    expr = filter_expression(period, shifts, equipment, fuels)
+    table = dataset.to_table(
+        columns=[SOURCE, "rec", DATE, SHIFT, EQUIPMENT, FUEL, "hours", "engine", "usage"],
+        filter=expr,
+    )
+    flat = table.to_pandas()
+
+    # Номера записей уникальны только внутри выгрузки
+    source_codes, _ = pd.factorize(flat[SOURCE], sort=True)
+    rec = flat["rec"].to_numpy(dtype=np.int64)
+    keys = source_codes.astype(np.int64) * (int(rec.max(initial=0)) + 1) + rec
+    _, first, codes = np.unique(keys, return_index=True, return_inverse=True)
+
+    df = flat.iloc[first][DIMENSIONS].reset_index(drop=True)
+    df[EQUIPMENT] = df[EQUIPMENT].astype("category")
+    segments = pd.DataFrame({
+        "rec": codes.astype(np.int64),
+        "hours": flat["hours"].to_numpy(dtype=np.float64),
+        "engine": flat["engine"].to_numpy(dtype=bool),
+        "usage": flat["usage"].astype("category"),
+    })
+    return df, SegmentStore.from_frame(segments, len(df))
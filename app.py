@@ -1,445 +1,527 @@
+import os
+import uuid
+
 import streamlit as st
-import pandas as pd
-import json
-from datetime import datetime
-import plotly.express as px
+
+from analytics.background import follow, result, shared_jobs
+from analytics.cache import content_hash, shared_cache
+from analytics.charts import MAX_TRACES, entity_pages, line_figure
+from analytics.cube import build_cube, cube_kisvr, cube_kkf, slice_cube
+from analytics.incremental import append, load_store, save_store, store_averages
+from analytics.ingest import STREAMING_THRESHOLD, load_json, with_segments
+from analytics.kpi import COL_KISVR, COL_KKF, RULES, SHIFTS, reduce_records
+from analytics.merge import RunningAverages, iter_reduced, merge_results, scan_directory, spool
+from analytics.pipeline import filter_key, filter_positions, period_averages
+from analytics.profiling import Profiler, activate, stage
+from analytics.registry import shared_registry
+from analytics.smoothing import smoothing_stage
+from analytics.storage import (
+    fingerprint, history_dimensions, open_history, read_history, write_dataset,
+)
+
+HISTORY_DIR = os.environ.get("DV_HISTORY_DIR", "data/history")
+STORE_DIR = os.environ.get("DV_STORE_DIR", "data/store")
+WATCH_DIR = os.environ.get("DV_WATCH_DIR", "data/incoming")
+# Период проверки каталога с выгрузками, с (переменная окружения DV_WATCH_SECONDS)
+WATCH_SECONDS = int(os.environ.get("DV_WATCH_SECONDS", 30))
+# Файл, в который дописываются замеры каждого запуска (JSON lines)
+PROFILE_LOG = os.environ.get("DV_PROFILE_LOG")
+
+# Графики дашборда: (заголовок, серия из smoothing_stage, показатель, цвет,
+# тип линии, название, подписи осей)
+AVERAGE_CHARTS = [
+    ("📈 График: Ккф по дням (среднее)", "average_kkf", "Сглаженное Ккф", None, None,
+     "Среднее Ккф по дням", {"Сглаженное Ккф": "Среднее Ккф"}),
+    ("📈 График: Тпл (плановый фонд) по дням (среднее)", "average_kkf", "Сглаженное Тпл", None, None,
+     "Среднее Тпл по дням", {"Сглаженное Тпл": "Среднее Тпл"}),
+    ("📈 График: Кисвр по дням (среднее)", "average_kisvr", "Сглаженное Кисвр", "Смена", None,
+     "Среднее Кисвр по дням и сменам", {"Сглаженное Кисвр": "Среднее Кисвр"}),
+    ("📈 График: Тчсм по дням (среднее)", "average_chsm", "Сглаженное Тчсм", None, None,
+     "Среднее Тчсм по дням", {"Сглаженное Тчсм": "Среднее Тчсм"}),
+    ("📈 График: Кио по дням (среднее)", "average_kkf", "Сглаженный Кио", None, None,
+     "Среднее Кио по дням", {"Сглаженный Кио": "Кио"}),
+    ("📈 График: Ктг по дням (среднее)", "average_kkf", "Сглаженный Ктг", None, None,
+     "Среднее Ктг по дням", {"Сглаженный Ктг": "Ктг"}),
+]
+EQUIPMENT_CHARTS = [
+    ("📈 График: Ккф по дням", "equipment_kkf", "Сглаженное Ккф", "Оборудование", None,
+     "Динамика Ккф по дням", None),
+    ("📈 График: Тпл (плановый фонд) по дням и оборудованию", "equipment_kkf", "Сглаженное Тпл", "Оборудование", None,
+     "Динамика Тпл по дням", {"Сглаженное Тпл": "Тпл"}),
+    ("📈 График: Кисвр по дням и сменам", "equipment_kisvr", "Сглаженное Кисвр", "Оборудование", "Смена",
+     "Динамика Кисвр по дням и сменам", None),
+    ("📈 График: Тчсм по дням и сменам", "equipment_kisvr", "Сглаженное Тчсм", "Оборудование", "Смена",
+     "Динамика Тчсм по дням и сменам", {"Сглаженное Тчсм": "Тчсм"}),
+    ("📈 График: Кио по дням", "equipment_kkf", "Сглаженный Кио", "Оборудование", None,
+     "Динамика Кио по дням и оборудованию", {"Сглаженный Кио": "Кио"}),
+    ("📈 График: Ктг по дням", "equipment_kkf", "Сглаженный Ктг", "Оборудование", None,
+     "Динамика Ктг по дням и оборудованию", {"Сглаженный Ктг": "Ктг"}),
+]
 
 st.set_page_config(page_title="Анализ работы оборудования", layout="wide")
 
 st.title("📊 Анализ работы оборудования")
 
-uploaded_file = st.file_uploader("Загрузите JSON файл", type="json")
+source = st.sidebar.radio(
+    "Источник данных", ["Загрузка JSON", "Каталог JSON", "Архив Parquet", "Накопленная история"]
+)
+# Какой регламент (таблица правил DV_RULES) применяется к показателям
+st.sidebar.caption(f"Регламент: {RULES.regulation or os.path.basename(RULES.source)}")
+# По умолчанию секунды отбрасываются, как в регламентном расчёте (часы + минуты/60);
+# в архиве часы уже посчитаны при сохранении
+seconds = False
+if source != "Архив Parquet":
+    seconds = st.sidebar.checkbox("Учитывать секунды в продолжительности участков")
+
+# Замеры этапов: время, память, число строк и участков (панель внизу боковой панели)
+profiling = st.sidebar.checkbox(
+    "Профилирование этапов", value=os.environ.get("DV_PROFILE") == "1" or bool(PROFILE_LOG)
+)
+profiler = Profiler() if profiling else None
+activate(profiler)
+
+# Кэш общий для перезапусков скрипта: ключ - хэш содержимого и состояние фильтров
+cache = shared_cache()
+options = None
+
+# Загрузка, показатели и графики считаются в фоновых задачах сессии: скрипт
+# только выводит готовые части, и смена фильтров прерывает его сразу, а не
+# после расчёта для прежних фильтров
+jobs = shared_jobs()
+owner = st.session_state.setdefault("jobs_owner", uuid.uuid4().hex)
+
+# Выгрузки JSON - в общем реестре процесса: одна копия (memmap) на выгрузку,
+# сколько бы сессий её ни смотрели
+registry = shared_registry()
+dataset = None
+# Участки для таблицы записей (только загрузка одного файла без потокового режима)
+record_segments = None
+
+
+def waiting(status, label):
+    # Вывод статуса при опросе задачи - точка, где Streamlit прерывает устаревший запуск
+    return lambda seconds: status.caption(f"⏳ {label}… {seconds:.1f} с")
+
+
+def background(slot, key, label, compute):
+    """Результат загрузки compute() из фоновой задачи сессии (с тем же ключом - общей
+    для перезапусков); загрузки идут в своём пуле, не занимая потоки таблиц и графиков."""
+    status = st.empty()
+    value = result(jobs.submit(owner, slot, key, lambda job: compute(), loading=True), waiting(status, label))
+    status.empty()
+    return value
+
+
+def upload_hash(uploaded):
+    """Хэш содержимого загруженного файла: считается один раз на загрузку
+    (file_id), а не при каждом перезапуске скрипта."""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    if uploaded.file_id not in hashes:
+        hashes[uploaded.file_id] = content_hash(uploaded)
+    return hashes[uploaded.file_id]
+
+
+def load_many(sources):
+    """Несколько выгрузок {ключ: путь или загруженный файл}: каждая разбирается
+    в своём процессе, итог по уже готовым файлам показывается, не дожидаясь остальных.
+    Возвращает результаты разобранных файлов для merge_results и ошибки
+    разбора; вызывается только при сборке выгрузки в реестре."""
+    results = {key: cache.get(("reduced", seconds) + key) for key in sources}
+    pending = {key: source for key, source in sources.items() if results[key] is None}
+    if pending:
+        # Загруженные файлы - во временные файлы: исполнителям передаётся путь, а не байты
+        paths = {key: source if isinstance(source, str) else spool(source) for key, source in pending.items()}
+        progress = st.progress(0.0)
+        live = st.empty()
+        # Предварительные средние: каждый готовый файл добавляется один раз
+        running = RunningAverages()
+        for result in results.values():
+            if isinstance(result, tuple):
+                running.add(result)
+        try:
+            for i, (key, result) in enumerate(iter_reduced(paths, seconds), 1):
+                # Ошибка тоже кэшируется, чтобы не разбирать файл при каждом перезапуске
+                results[key] = cache.put(("reduced", seconds) + key, result)
+                progress.progress(i / len(pending), text=f"Обработано файлов: {i} из {len(pending)}")
+                if isinstance(result, tuple):
+                    running.add(result)
+                if running.records and i < len(pending):
+                    with live.container():
+                        cols_live = st.columns(3)
+                        cols_live[0].metric("Загружено записей", running.records)
+                        cols_live[1].metric("Среднее значение Ккф (предварительно)", round(running.mean(COL_KKF), 3))
+                        cols_live[2].metric("Среднее значение Кисвр (предварительно)", round(running.mean(COL_KISVR), 3))
+        finally:
+            for key, path in paths.items():
+                if path is not pending[key]:
+                    os.remove(path)
+        progress.empty()
+        live.empty()
+
+    ready = [key for key in sources if isinstance(results[key], tuple)]
+    if not ready:
+        show_errors(file_errors(sources, results))
+        st.stop()
+    return [results[key] for key in ready], file_errors(sources, results)
+
+
+def file_errors(sources, results):
+    """Ошибки разбора файлов: [(файл, сообщение)]."""
+    return [
+        (os.path.basename(key[0]), str(results[key]))
+        for key in sources if isinstance(results[key], Exception)
+    ]
+
+
+def build_many(sources):
+    """Выгрузка из нескольких файлов для реестра: (записи, куб, ошибки разбора).
+    Ошибки хранятся в реестре вместе с таблицами и после перезапуска сервера."""
+    parts, errors = load_many(sources)
+    return (*merge_results(parts), errors)
+
+
+def show_errors(errors):
+    for name, message in errors:
+        st.error(f"{name}: {message}")
+
+
+if source == "Загрузка JSON":
+    uploaded_files = st.file_uploader("Загрузите JSON файлы", type="json", accept_multiple_files=True)
+
+    if len(uploaded_files) > 1:
+        sources = {(f.name, upload_hash(f)): f for f in uploaded_files}
+        dataset_key = ("files", seconds) + tuple(sorted(key[1] for key in sources))
+        with stage("Загрузка выгрузок", files=len(sources)) as info:
+            # Файлы разбираются только если выгрузки ещё нет в реестре
+            dataset = registry.acquire(owner, dataset_key, lambda: build_many(sources))
+            df, cube = dataset.df, dataset.cube
+            info.update(rows=len(df), cells=len(cube))
+        show_errors(dataset.errors)
+        options = df
+
+    elif uploaded_files:
+        uploaded_file = uploaded_files[0]
+        streaming = st.checkbox(
+            "Потоковая загрузка (для больших файлов, без массивов участков в таблице)",
+            value=uploaded_file.size > STREAMING_THRESHOLD,
+        )
+        dataset_key = (upload_hash(uploaded_file), streaming, seconds)
+
+        def load_dataset():
+            df, segments = load_json(uploaded_file, streaming, seconds)
+            cache.put(("segments",) + dataset_key, segments)
+            # Куб сумм времени по ячейкам (оборудование, смена, день, топливо):
+            # фильтры дальше работают с кубом, а не с участками
+            with stage("Суммы по записям", rows=len(df), segments=len(segments)):
+                reduced = reduce_records(df, segments)
+            with stage("Куб") as info:
+                cube = build_cube(reduced)
+                info["cells"] = len(cube)
+            return df, cube
+
+        try:
+            with stage("Загрузка выгрузки") as info:
+                dataset = background(
+                    "dataset", dataset_key, "Загрузка выгрузки",
+                    lambda: registry.acquire(owner, dataset_key, load_dataset),
+                )
+                df, cube = dataset.df, dataset.cube
+                info.update(rows=len(df), cells=len(cube))
+        except ValueError:
+            st.error("Некорректный формат JSON")
+            st.stop()
+        options = df
+        if not streaming:
+            # В реестре только измерения записей; участки для таблицы - из кэша,
+            # после перезапуска сервера - разбором файла заново
+            def record_segments():
+                return cache.get_or_compute(
+                    ("segments",) + dataset_key, lambda: load_json(uploaded_file, True, seconds)[1]
+                )
 
-if uploaded_file:
-    data = json.load(uploaded_file)
-    
-    if isinstance(data, dict):
-        df = pd.json_normalize(data)
-    elif isinstance(data, list):
-        df = pd.json_normalize(data)
+        history_dir = st.sidebar.text_input("Каталог архива", HISTORY_DIR)
+        if st.sidebar.button("Сохранить выгрузку в архив"):
+            # Имя с хэшем содержимого: другая выгрузка с тем же именем файла
+            # сохраняется рядом, а не поверх
+            name = f"{os.path.splitext(uploaded_file.name)[0]}-{upload_hash(uploaded_file)[:12]}"
+            write_dataset(*load_json(uploaded_file, streaming=True, seconds=seconds), history_dir, name)
+            st.sidebar.success(f"Сохранено: {os.path.join(history_dir, name)}")
+elif source == "Каталог JSON":
+    watch_dir = st.sidebar.text_input("Каталог с выгрузками", WATCH_DIR)
+    # Каталог просматривается при каждом перезапуске; разбираются только новые и изменённые файлы
+    st.sidebar.button("Проверить новые файлы")
+    if os.path.isdir(watch_dir):
+        sources = scan_directory(watch_dir)
+
+        @st.fragment(run_every=WATCH_SECONDS)
+        def watch_changes():
+            # По таймеру перезапускается только проверка; страница - если файлы изменились
+            if scan_directory(watch_dir).keys() != sources.keys():
+                st.rerun(scope="app")
+
+        watch_changes()
+        if not sources:
+            st.info("В каталоге нет JSON-файлов")
+            st.stop()
+        dataset_key = ("watch", seconds) + tuple(sources)
+        with stage("Загрузка выгрузок", files=len(sources)) as info:
+            # Файлы разбираются только если выгрузки ещё нет в реестре
+            dataset = registry.acquire(owner, dataset_key, lambda: build_many(sources))
+            df, cube = dataset.df, dataset.cube
+            info.update(rows=len(df), cells=len(cube))
+        show_errors(dataset.errors)
+        options = df
     else:
-        st.error("Некорректный формат JSON")
-        st.stop()
-    
-    df["Дата"] = pd.to_datetime(df["Дата"], errors="coerce")
+        st.info("Каталог с выгрузками не найден")
+elif source == "Накопленная история":
+    store_dir = st.sidebar.text_input("Каталог истории", STORE_DIR)
+    dataset_key = ("store", store_dir, fingerprint(store_dir))
+    with stage("Загрузка истории") as info:
+        store = cache.get_or_compute(dataset_key, lambda: load_store(store_dir))
+        info.update(rows=len(store["records"]), cells=len(store["cube"]))
+    new_files = st.sidebar.file_uploader(
+        "Новые выгрузки (дозагрузка)", type="json", accept_multiple_files=True
+    )
+    if new_files and st.sidebar.button("Добавить в историю"):
+        # Пересчитываются только ячейки, которые есть в новых выгрузках;
+        # повторная загрузка файла или исправление за прошлый день заменяет их
+        touched = 0
+        for new_file in new_files:
+            try:
+                with stage("Дозагрузка", file=new_file.name) as info:
+                    store, cells = append(store, *load_json(new_file, streaming=True, seconds=seconds))
+                    save_store(store, store_dir, cells)
+                    info["cells"] = len(cells)
+            except ValueError:
+                st.sidebar.error(f"{new_file.name}: Некорректный формат JSON")
+                continue
+            touched += len(cells)
+        dataset_key = ("store", store_dir, fingerprint(store_dir))
+        cache.put(dataset_key, store)
+        st.sidebar.success(f"Обновлено ячеек (оборудование, смена, день): {touched}")
+
+    if store["cube"].empty:
+        st.info("История пуста: добавьте выгрузки в боковой панели.")
+    else:
+        df, cube = store["records"], store["cube"]
+        options = df
+else:
+    history_dir = st.sidebar.text_input("Каталог архива", HISTORY_DIR)
+    if os.path.isdir(history_dir):
+        dataset_key = ("history", history_dir, fingerprint(history_dir))
+        options = cache.get_or_compute(
+            ("dimensions",) + dataset_key,
+            lambda: history_dimensions(open_history(history_dir)),
+        )
+        if options.empty:
+            st.warning("В архиве нет данных")
+            st.stop()
+    else:
+        st.info("Каталог архива не найден. Сохраните в него выгрузку в режиме загрузки JSON.")
 
+# Сессия не смотрит выгрузку из реестра: она может быть вытеснена
+if dataset is None:
+    registry.release(owner)
+
+if options is not None:
     st.sidebar.header("Фильтры")
 
-    min_date = df["Дата"].min().date()
-    max_date = df["Дата"].max().date()
+    min_date = options["Дата"].min().date()
+    max_date = options["Дата"].max().date()
     period = st.sidebar.date_input("Период", [min_date, max_date])
 
-    смена = st.sidebar.multiselect("Смена", df["Смена"].unique())
-    оборудование = st.sidebar.multiselect("Оборудование", df["Оборудование"].unique())
-    топливо = st.sidebar.multiselect("Топливо", df["Топливо"].unique())
+    смена = st.sidebar.multiselect("Смена", options["Смена"].unique())
+    оборудование = st.sidebar.multiselect("Оборудование", options["Оборудование"].unique())
+    топливо = st.sidebar.multiselect("Топливо", options["Топливо"].unique())
 
     smoothing_window = st.sidebar.slider("Сглаживание (кол-во дней)", 1, 10, 1)
 
-    filtered_df = df.copy()
-    if len(period) == 2:
-        start, end = period
-        filtered_df = filtered_df[(filtered_df["Дата"].dt.date >= start) & (filtered_df["Дата"].dt.date <= end)]
-    if смена:
-        filtered_df = filtered_df[filtered_df["Смена"].isin(смена)]
-    if оборудование:
-        filtered_df = filtered_df[filtered_df["Оборудование"].isin(оборудование)]
-    if топливо:
-        filtered_df = filtered_df[filtered_df["Топливо"].isin(топливо)]
+    filters_key = dataset_key + filter_key(period, смена, оборудование, топливо)
+    unfiltered = tuple(period) == (min_date, max_date) and not (смена or оборудование or топливо)
+    # Вся накопленная история без фильтров: таблицы и средние уже посчитаны при дозагрузке
+    full_history = source == "Накопленная история" and unfiltered
+
+    # Фильтры изменились: задачи сессии для прежних фильтров отменяются
+    if st.session_state.get("jobs_filters") != filters_key:
+        jobs.cancel(owner)
+        st.session_state["jobs_filters"] = filters_key
+
+    if source == "Архив Parquet":
+        # Фильтры передаются в чтение: читаются только нужные секции и группы строк
+        def load_history():
+            df, segments = read_history(open_history(history_dir), period, смена, оборудование, топливо)
+            return df, build_cube(reduce_records(df, segments))
+
+        with stage("Чтение архива") as info:
+            df, cube = background(
+                "dataset", filters_key, "Чтение архива",
+                lambda: cache.get_or_compute(("dataset",) + filters_key, load_history),
+            )
+            info.update(rows=len(df), cells=len(cube))
+
+    # В кэше - только номера отфильтрованных записей, не копия таблицы
+    with stage("Фильтры") as info:
+        positions = cache.get_or_compute(
+            ("filtered",) + filters_key,
+            lambda: filter_positions(df, period, смена, оборудование, топливо),
+        )
+        info["rows"] = len(positions)
 
     st.subheader("Отфильтрованные данные")
-    with st.expander("📊 Таблица: Все данные"):
-        st.dataframe(filtered_df)
+    with st.expander("📊 Таблица: Все данные"), stage("Вывод таблицы записей", rows=len(positions)):
+        if record_segments is not None:
+            st.dataframe(with_segments(df, record_segments(), positions))
+        else:
+            st.dataframe(df if len(positions) == len(df) else df.take(positions))
     
-    if not filtered_df.empty:
-        kkf_results = []
-        kisvr_results = []
-
-        # Календарный фонд (одинаков для всех)
-        days_count = filtered_df["Дата"].dt.date.nunique()
-        T_k = days_count * 24
-
-        # Ккф + Тпл + Кио + Ктг по дате и оборудованию
-        for (equip, date), group in filtered_df.groupby(["Оборудование", filtered_df["Дата"].dt.date]):
-            T_f = 0   # фактическое время работы
-            T_ppr = 0 # время ППР
-            T_pzo = T_ob = T_ln = T_reg = T_rem = 0
-
-            for _, row in group.iterrows():
-                durations = [datetime.fromisoformat(x) for x in row["ПоказателиОборудованияПоУчасткамПродолжительность"]]
-                durations_hours = [(d.hour + d.minute/60) for d in durations]
-                includes = row["ПоказателиОборудованияПоУчасткамВключенДвигатель"]
-                usage_types = row["ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени"]
-
-                # Фактическое время (двигатель включен)
-                T_f += sum([dur for dur, inc in zip(durations_hours, includes) if inc])
-
-                # ППР
-                T_ppr += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "ППР"])
-
-                # Для Кио
-                T_pzo += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "ЕО"])
-                T_ob  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Обед"])
-                T_ln  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Личные надобности"])
-                T_reg += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage in ["Выдача путевого листа", "Заправка"]])
-
-                # Для Ктг (ремонтные состояния)
-                T_rem += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage in [
-                    "Аварийный ремонт оборудования узлов и агрегатов",
-                    "Обкатка ДВС",
-                    "ТО",
-                    "Ремонт",
-                    "ППР"
-                ]])
-
-            T_kl = 24  # календарный фонд за день
-            T_pl = T_kl - T_ppr  # плановый фонд
-            K_kf = T_f / T_kl if T_kl > 0 else 0
-
-            # Кио
-            denom_ki = T_kl - T_pzo - T_ob - T_ln - T_reg
-            K_io = T_f / denom_ki if denom_ki > 0 else 0
-
-            # Ктг
-            denom_ktg = T_kl - T_ob - T_ln
-            K_tg = (denom_ktg - T_rem) / denom_ktg if denom_ktg > 0 else 0
-
-            kkf_results.append({
-                "Оборудование": equip,
-                "Дата": date,
-                "Календарный фонд (Тк), ч": T_kl,
-                "Плановый фонд (Тпл), ч": round(T_pl, 2),
-                "Фактическое время работы (Тф), ч": round(T_f, 2),
-                "Время ППР (Тппр), ч": round(T_ppr, 2),
-                "Коэф. использования календарного фонда (Ккф)": round(K_kf, 3),
-                "Коэф. использования рабочего фонда (Кио)": round(K_io, 3),
-                "Коэф. технической готовности (Ктг)": round(K_tg, 3),
-            })
-
-        # Кисвр + Тчсм по дате, смене и оборудованию
-        for (equip, shift, date), group in filtered_df.groupby(["Оборудование", "Смена", filtered_df["Дата"].dt.date]):
-            T_sm = 0
-            T_sm_f = 0
-            T_pzo = T_ob = T_ln = T_reg = 0
-            for _, row in group.iterrows():
-                durations = [datetime.fromisoformat(x) for x in row["ПоказателиОборудованияПоУчасткамПродолжительность"]]
-                durations_hours = [(d.hour + d.minute/60) for d in durations]
-                includes = row["ПоказателиОборудованияПоУчасткамВключенДвигатель"]
-                usage_types = row["ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени"]
-
-                # Суммарное время в смене
-                T_sm += sum(durations_hours)
-
-                # Фактическое время (двигатель включен)
-                T_sm_f += sum([dur for dur, inc in zip(durations_hours, includes) if inc])
-
-                # Разбивка по видам времени
-                T_pzo += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "ЕО"])
-                T_ob  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Обед"])
-                T_ln  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Личные надобности"])
-                T_reg += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage in ["Выдача путевого листа", "Заправка"]])
-
-            # Чистое время работы в смену
-            T_chsm = T_sm - T_pzo - T_ob - T_ln - T_reg
-
-            K_is_vr = T_sm_f / T_sm if T_sm > 0 else 0
-            kisvr_results.append({
-                "Оборудование": equip,
-                "Смена": shift,
-                "Дата": date,
-                "Суммарное время (Тсм), ч": round(T_sm, 2),
-                "Рабочее время в смене (Тсмф), ч": round(T_sm_f, 2),
-                "Чистое время работы в смену (Тчсм), ч": round(T_chsm, 2),
-                "Коэф. использования по времени (Кисвр)": round(K_is_vr, 3),
-            })
-
-        kkf_df = pd.DataFrame(kkf_results)
-        kisvr_df = pd.DataFrame(kisvr_results)
-
-        with st.expander("📊 Таблица: Ккф по дням"):
-            st.dataframe(kkf_df)
-
-        with st.expander("📊 Таблица: Кисвр по дням и сменам"):
-            st.dataframe(kisvr_df)
+    if len(positions):
+        def kpi_job(job):
+            def kpi_tables():
+                if full_history:
+                    return store["kkf"], store["kisvr"]
+                cells = slice_cube(cube, period, смена, оборудование, топливо)
+                # Ккф + Тпл + Кио + Ктг по дате и оборудованию,
+                # Кисвр + Тчсм по дате, смене и оборудованию
+                return cube_kkf(cells), cube_kisvr(cells)
+
+            with stage("Таблицы Ккф и Кисвр") as info:
+                if dataset is not None and unfiltered:
+                    # Таблицы без фильтров посчитаны при регистрации выгрузки, общие для всех сессий
+                    kkf_df, kisvr_df = dataset.kkf, dataset.kisvr
+                else:
+                    kkf_df, kisvr_df = cache.get_or_compute(("kpi",) + filters_key, kpi_tables)
+                info.update(rows=len(kkf_df) + len(kisvr_df))
+            # Таблицы выводятся, пока считаются средние
+            job.emit((kkf_df, kisvr_df))
+            with stage("Средние"):
+                return cache.get_or_compute(
+                    ("averages",) + filters_key,
+                    lambda: store_averages(store) if full_history else period_averages(kkf_df, kisvr_df),
+                )
+
+        tables = st.container()
+        status = st.empty()
+        with stage("Показатели"):
+            job = jobs.submit(owner, "kpi", filters_key, kpi_job)
+            for kkf_df, kisvr_df in follow(job, waiting(status, "Расчёт показателей")):
+                with tables:
+                    with st.expander("📊 Таблица: Ккф по дням"):
+                        st.dataframe(kkf_df)
+
+                    with st.expander("📊 Таблица: Кисвр по дням и сменам"):
+                        st.dataframe(kisvr_df)
+            averages = job.future.result()
+        status.empty()
 
         st.subheader("📌 Средние значения за выбранный период")
 
-        # Среднее Ккф по оборудованию
-        avg_kkf = kkf_df.groupby("Оборудование")["Коэф. использования календарного фонда (Ккф)"].mean().reset_index()
-        avg_kkf.rename(columns={"Коэф. использования календарного фонда (Ккф)": "Среднее Ккф"}, inplace=True)
         with st.expander("Среднее Ккф по оборудованию:"):
-            st.dataframe(avg_kkf)
+            st.dataframe(averages["avg_kkf"])
 
-        # Среднее Кисвр по сменам
-        avg_kisvr = kisvr_df.groupby(["Оборудование", "Смена"])["Коэф. использования по времени (Кисвр)"].mean().reset_index()
-        avg_kisvr.rename(columns={"Коэф. использования по времени (Кисвр)": "Среднее Кисвр"}, inplace=True)
         with st.expander("Среднее Кисвр по сменам:"):
-            st.dataframe(avg_kisvr)
+            st.dataframe(averages["avg_kisvr"])
             
         cols_avg = st.columns(4)
         
-        overall_avg_kkf = round(kkf_df["Коэф. использования календарного фонда (Ккф)"].mean(), 3)
-        
         days = (period[1] - period[0]).days + 1
         cols_avg[0].metric("Календарный фонд времени Тк", days*24)
-        cols_avg[1].metric("Среднее значение Ккф", overall_avg_kkf)
+        cols_avg[1].metric("Среднее значение Ккф", averages["overall_kkf"])
         
-        shifts = ["1 смена (07-19)", "2 смена (19-07)"]
-        for i, shift in enumerate(shifts):
-            avg_shift = kisvr_df[kisvr_df["Смена"] == shift]["Коэф. использования по времени (Кисвр)"].mean()
-            avg_shift = round(avg_shift, 3) if not pd.isna(avg_shift) else 0
-            cols_avg[i+2].metric(f"Среднее значение Кисвр по {shift}", avg_shift)
+        for i, shift in enumerate(SHIFTS):
+            cols_avg[i+2].metric(f"Среднее значение Кисвр по {shift}", averages["kisvr_by_shift"][shift])
 
         cols_extra = st.columns(5)
         
         # Суммарное время ППР за выбранный период
-        total_ppr = round(kkf_df["Время ППР (Тппр), ч"].sum(), 2)
-        cols_extra[0].metric("Суммарное время ППР (Тппр)", total_ppr)
+        cols_extra[0].metric("Суммарное время ППР (Тппр)", averages["total_ppr"])
 
         # Среднее значение Тпл
-        avg_tpl = round(kkf_df["Плановый фонд (Тпл), ч"].mean(), 2)
-        cols_extra[1].metric("Среднее значение Тпл", avg_tpl)
+        cols_extra[1].metric("Среднее значение Тпл", averages["avg_tpl"])
 
         # Среднее значение Тчсм
-        avg_chsm = round(kisvr_df["Чистое время работы в смену (Тчсм), ч"].mean(), 2)
-        cols_extra[2].metric("Среднее значение Тчсм", avg_chsm)
+        cols_extra[2].metric("Среднее значение Тчсм", averages["avg_chsm"])
 
         # Среднее значение Кио
-        avg_kio = round(kkf_df["Коэф. использования рабочего фонда (Кио)"].mean(), 3)
-        cols_extra[3].metric("Среднее значение Кио", avg_kio)
+        cols_extra[3].metric("Среднее значение Кио", averages["avg_kio"])
 
         # Среднее значение Ктг
-        avg_ktg = round(kkf_df["Коэф. технической готовности (Ктг)"].mean(), 3)
-        cols_extra[4].metric("Среднее значение Ктг", avg_ktg)
+        cols_extra[4].metric("Среднее значение Ктг", averages["avg_ktg"])
         
         st.subheader("📅 Вывести графики по дням")
         col_graphs = st.columns(2)
+        # Выбранный набор графиков запоминается, чтобы листать страницы оборудования
         if col_graphs[0].button("Построить графики (среднее значение)"):
-            avg_kkf_per_day = kkf_df.groupby("Дата")["Коэф. использования календарного фонда (Ккф)"].mean().reset_index()
-            if smoothing_window > 1:
-                avg_kkf_per_day["Сглаженное Ккф"] = avg_kkf_per_day["Коэф. использования календарного фонда (Ккф)"].rolling(smoothing_window, min_periods=1).mean()
-            else:
-                avg_kkf_per_day["Сглаженное Ккф"] = avg_kkf_per_day["Коэф. использования календарного фонда (Ккф)"]
-            
-            fig_avg_kkf = px.line(
-                avg_kkf_per_day,
-                x="Дата",
-                y="Сглаженное Ккф",
-                markers=True,
-                title=f"Среднее Ккф по дням (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженное Ккф": "Среднее Ккф"}
-            )
-            st.subheader("📈 График: Ккф по дням (среднее)")
-            st.plotly_chart(fig_avg_kkf, use_container_width=True)
-
-            # --- График Тпл по дням ---
-            avg_tpl_per_day = kkf_df.groupby("Дата")["Плановый фонд (Тпл), ч"].mean().reset_index()
-            if smoothing_window > 1:
-                avg_tpl_per_day["Сглаженное Тпл"] = avg_tpl_per_day["Плановый фонд (Тпл), ч"].rolling(smoothing_window, min_periods=1).mean()
-            else:
-                avg_tpl_per_day["Сглаженное Тпл"] = avg_tpl_per_day["Плановый фонд (Тпл), ч"]
-
-            fig_avg_tpl = px.line(
-                avg_tpl_per_day,
-                x="Дата",
-                y="Сглаженное Тпл",
-                markers=True,
-                title=f"Среднее Тпл по дням (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженное Тпл": "Среднее Тпл"}
-            )
-            st.subheader("📈 График: Тпл (плановый фонд) по дням (среднее)")
-            st.plotly_chart(fig_avg_tpl, use_container_width=True)
-
-            avg_kisvr_per_day_shift = kisvr_df.groupby(["Дата", "Смена"])["Коэф. использования по времени (Кисвр)"].mean().reset_index()
-            if smoothing_window > 1:
-                avg_kisvr_per_day_shift["Сглаженное Кисвр"] = avg_kisvr_per_day_shift.groupby("Смена")["Коэф. использования по времени (Кисвр)"].transform(lambda x: x.rolling(smoothing_window, min_periods=1).mean())
-            else:
-                avg_kisvr_per_day_shift["Сглаженное Кисвр"] = avg_kisvr_per_day_shift["Коэф. использования по времени (Кисвр)"]
-            
-            fig_avg_kisvr = px.line(
-                avg_kisvr_per_day_shift,
-                x="Дата",
-                y="Сглаженное Кисвр",
-                color="Смена",
-                markers=True,
-                title=f"Среднее Кисвр по дням и сменам (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженное Кисвр": "Среднее Кисвр"}
-            )
-            st.subheader("📈 График: Кисвр по дням (среднее)")
-            st.plotly_chart(fig_avg_kisvr, use_container_width=True)
-
-            # --- График Тчсм по дням ---
-            avg_chsm_per_day = kisvr_df.groupby("Дата")["Чистое время работы в смену (Тчсм), ч"].mean().reset_index()
-            if smoothing_window > 1:
-                avg_chsm_per_day["Сглаженное Тчсм"] = avg_chsm_per_day["Чистое время работы в смену (Тчсм), ч"].rolling(smoothing_window, min_periods=1).mean()
-            else:
-                avg_chsm_per_day["Сглаженное Тчсм"] = avg_chsm_per_day["Чистое время работы в смену (Тчсм), ч"]
-
-            fig_avg_chsm = px.line(
-                avg_chsm_per_day,
-                x="Дата",
-                y="Сглаженное Тчсм",
-                markers=True,
-                title=f"Среднее Тчсм по дням (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженное Тчсм": "Среднее Тчсм"}
-            )
-            st.subheader("📈 График: Тчсм по дням (среднее)")
-            st.plotly_chart(fig_avg_chsm, use_container_width=True)
-
-            # --- График Кио по дням ---
-            avg_kio_per_day = kkf_df.groupby("Дата")["Коэф. использования рабочего фонда (Кио)"].mean().reset_index()
-            if smoothing_window > 1:
-                avg_kio_per_day["Сглаженный Кио"] = avg_kio_per_day["Коэф. использования рабочего фонда (Кио)"].rolling(smoothing_window, min_periods=1).mean()
-            else:
-                avg_kio_per_day["Сглаженный Кио"] = avg_kio_per_day["Коэф. использования рабочего фонда (Кио)"]
-
-            fig_avg_kio = px.line(
-                avg_kio_per_day,
-                x="Дата",
-                y="Сглаженный Кио",
-                markers=True,
-                title=f"Среднее Кио по дням (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженный Кио": "Кио"}
-            )
-            st.subheader("📈 График: Кио по дням (среднее)")
-            st.plotly_chart(fig_avg_kio, use_container_width=True)
-
-            # --- График Ктг по дням ---
-            avg_ktg_per_day = kkf_df.groupby("Дата")["Коэф. технической готовности (Ктг)"].mean().reset_index()
-            if smoothing_window > 1:
-                avg_ktg_per_day["Сглаженный Ктг"] = avg_ktg_per_day["Коэф. технической готовности (Ктг)"].rolling(smoothing_window, min_periods=1).mean()
-            else:
-                avg_ktg_per_day["Сглаженный Ктг"] = avg_ktg_per_day["Коэф. технической готовности (Ктг)"]
-
-            fig_avg_ktg = px.line(
-                avg_ktg_per_day,
-                x="Дата",
-                y="Сглаженный Ктг",
-                markers=True,
-                title=f"Среднее Ктг по дням (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженный Ктг": "Ктг"}
-            )
-            st.subheader("📈 График: Ктг по дням (среднее)")
-            st.plotly_chart(fig_avg_ktg, use_container_width=True)
-            
-        
+            st.session_state["charts"] = "average"
         if col_graphs[1].button("Построить графики по оборудованию"):
-            st.subheader("📈 График: Ккф по дням")
-            kkf_plot_df = kkf_df.copy()
-            if smoothing_window > 1:
-                kkf_plot_df["Сглаженное Ккф"] = kkf_plot_df.groupby("Оборудование")["Коэф. использования календарного фонда (Ккф)"].transform(lambda x: x.rolling(smoothing_window, min_periods=1).mean())
-            else:
-                kkf_plot_df["Сглаженное Ккф"] = kkf_plot_df["Коэф. использования календарного фонда (Ккф)"]
-
-            fig_kkf = px.line(
-                kkf_plot_df,
-                x="Дата",
-                y="Сглаженное Ккф",
-                color="Оборудование",
-                markers=True,
-                title=f"Динамика Ккф по дням (сглаживание: {smoothing_window} дней)"
-            )
-            st.plotly_chart(fig_kkf, use_container_width=True)
-
-            st.subheader("📈 График: Тпл (плановый фонд) по дням и оборудованию")
-            tpl_plot_df = kkf_df.copy()
-            if smoothing_window > 1:
-                tpl_plot_df["Сглаженное Тпл"] = tpl_plot_df.groupby("Оборудование")["Плановый фонд (Тпл), ч"].transform(
-                    lambda x: x.rolling(smoothing_window, min_periods=1).mean()
+            st.session_state["charts"] = "equipment"
+
+        kind = st.session_state.get("charts")
+        if kind:
+            charts = AVERAGE_CHARTS if kind == "average" else EQUIPMENT_CHARTS
+            page = None
+            if kind == "equipment":
+                # Не больше MAX_TRACES машин на графике, остальные - на других страницах
+                pages = entity_pages(kkf_df["Оборудование"], MAX_TRACES)
+                page = pages[0]
+                if len(pages) > 1:
+                    page = pages[st.selectbox(
+                        "Оборудование на графиках",
+                        range(len(pages)),
+                        format_func=lambda i: f"{pages[i][0]} … {pages[i][-1]} ({len(pages[i])} шт.)",
+                    )]
+
+            def charts_job(job):
+                # Сглаженные серии для всех графиков - один расчёт на фильтры и окно
+                with stage("Сглаживание", rows=len(kkf_df) + len(kisvr_df)):
+                    smoothed = cache.get_or_compute(
+                        ("smoothed", smoothing_window) + filters_key,
+                        lambda: smoothing_stage(kkf_df, kisvr_df, smoothing_window),
+                    )
+                with stage("Построение графиков", figures=len(charts)):
+                    frames = {}
+                    for subheader, series, y, color, line_dash, title, labels in charts:
+                        job.check()
+                        if series not in frames:
+                            # Сглаживание посчитано по всему оборудованию, страница - только выборка строк
+                            frame = smoothed[series]
+                            frames[series] = frame if page is None else frame[frame["Оборудование"].isin(page)]
+                        job.emit((subheader, line_figure(
+                            frames[series],
+                            x="Дата",
+                            y=y,
+                            color=color,
+                            line_dash=line_dash,
+                            markers=True,
+                            title=f"{title} (сглаживание: {smoothing_window} дней)",
+                            labels=labels,
+                        )))
+
+            # Графики появляются по одному по мере построения
+            charts_area = st.container()
+            status = st.empty()
+            with stage("Графики"):
+                job = jobs.submit(
+                    owner, "charts", (kind, smoothing_window, tuple(page or ())) + filters_key, charts_job
                 )
-            else:
-                tpl_plot_df["Сглаженное Тпл"] = tpl_plot_df["Плановый фонд (Тпл), ч"]
-
-            fig_tpl = px.line(
-                tpl_plot_df,
-                x="Дата",
-                y="Сглаженное Тпл",
-                color="Оборудование",
-                markers=True,
-                title=f"Динамика Тпл по дням (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженное Тпл": "Тпл"}
-            )
-            st.plotly_chart(fig_tpl, use_container_width=True)
-
-            st.subheader("📈 График: Кисвр по дням и сменам")
-            kisvr_plot_df = kisvr_df.copy()
-            if smoothing_window > 1:
-                kisvr_plot_df["Сглаженное Кисвр"] = kisvr_plot_df.groupby(["Оборудование", "Смена"])["Коэф. использования по времени (Кисвр)"].transform(lambda x: x.rolling(smoothing_window, min_periods=1).mean())
-            else:
-                kisvr_plot_df["Сглаженное Кисвр"] = kisvr_plot_df["Коэф. использования по времени (Кисвр)"]
-
-            fig_kisvr = px.line(
-                kisvr_plot_df,
-                x="Дата",
-                y="Сглаженное Кисвр",
-                color="Оборудование",
-                line_dash="Смена",
-                markers=True,
-                title=f"Динамика Кисвр по дням и сменам (сглаживание: {smoothing_window} дней)"
-            )
-            st.plotly_chart(fig_kisvr, use_container_width=True)
-
-            st.subheader("📈 График: Тчсм по дням и сменам")
-            chsm_plot_df = kisvr_df.copy()
-            if smoothing_window > 1:
-                chsm_plot_df["Сглаженное Тчсм"] = chsm_plot_df.groupby(["Оборудование", "Смена"])["Чистое время работы в смену (Тчсм), ч"].transform(
-                    lambda x: x.rolling(smoothing_window, min_periods=1).mean()
-                )
-            else:
-                chsm_plot_df["Сглаженное Тчсм"] = chsm_plot_df["Чистое время работы в смену (Тчсм), ч"]
-
-            fig_chsm = px.line(
-                chsm_plot_df,
-                x="Дата",
-                y="Сглаженное Тчсм",
-                color="Оборудование",
-                line_dash="Смена",
-                markers=True,
-                title=f"Динамика Тчсм по дням и сменам (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженное Тчсм": "Тчсм"}
-            )
-            st.plotly_chart(fig_chsm, use_container_width=True)
-
-            # --- График Кио ---
-            st.subheader("📈 График: Кио по дням")
-            kio_plot_df = kkf_df.copy()
-            if smoothing_window > 1:
-                kio_plot_df["Сглаженный Кио"] = kio_plot_df.groupby(["Оборудование"])["Коэф. использования рабочего фонда (Кио)"].transform(
-                    lambda x: x.rolling(smoothing_window, min_periods=1).mean()
-                )
-            else:
-                kio_plot_df["Сглаженный Кио"] = kio_plot_df["Коэф. использования рабочего фонда (Кио)"]
-
-            fig_kio = px.line(
-                kio_plot_df,
-                x="Дата",
-                y="Сглаженный Кио",
-                color="Оборудование",
-                markers=True,
-                title=f"Динамика Кио по дням и оборудованию (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженный Кио": "Кио"}
-            )
-            st.plotly_chart(fig_kio, use_container_width=True)
-
-            # --- График Ктг ---
-            st.subheader("📈 График: Ктг по дням")
-            ktg_plot_df = kkf_df.copy()
-            if smoothing_window > 1:
-                ktg_plot_df["Сглаженный Ктг"] = ktg_plot_df.groupby(["Оборудование"])["Коэф. технической готовности (Ктг)"].transform(
-                    lambda x: x.rolling(smoothing_window, min_periods=1).mean()
-                )
-            else:
-                ktg_plot_df["Сглаженный Ктг"] = ktg_plot_df["Коэф. технической готовности (Ктг)"]
-
-            fig_ktg = px.line(
-                ktg_plot_df,
-                x="Дата",
-                y="Сглаженный Ктг",
-                color="Оборудование",
-                markers=True,
-                title=f"Динамика Ктг по дням и оборудованию (сглаживание: {smoothing_window} дней)",
-                labels={"Сглаженный Ктг": "Ктг"}
-            )
-            st.plotly_chart(fig_ktg, use_container_width=True)
+                for subheader, fig in follow(job, waiting(status, "Построение графиков")):
+                    with charts_area:
+                        st.subheader(subheader)
+                        st.plotly_chart(fig, use_container_width=True)
+                job.future.result()
+            status.empty()
 
     else:
         st.warning("Нет данных для выбранных фильтров")
+
+if profiler is not None:
+    with st.sidebar.expander("⏱ Профилирование", expanded=False):
+        st.dataframe(profiler.frame(), hide_index=True)
+        st.caption(f"Всего: {profiler.total_seconds():.3f} с")
+        context = {"source": source}
+        if PROFILE_LOG:
+            profiler.write_jsonl(PROFILE_LOG, **context)
+            st.caption(f"Записано в {PROFILE_LOG}")
+        st.download_button(
+            "Скачать JSONL", profiler.jsonl(**context),
+            file_name="profile.jsonl", mime="application/json",
+        )
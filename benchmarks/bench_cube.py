@@ -0,0 +1,66 @@
+"""Время ответа на смену фильтров: пересчёт по записям против среза куба.
+
+    python -m benchmarks.bench_cube --equipment 300 --days 60 --records 4
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from analytics.cube import build_cube, cube_kisvr, cube_kkf, slice_cube
+from analytics.kpi import compute_kisvr, compute_kkf, reduce_records
+from analytics.pipeline import apply_filters
+from benchmarks.bench_kpi import mismatches, timed
+from benchmarks.fleet import make_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--equipment", type=int, default=300)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--segments", type=int, default=20, help="участков на смену")
+    parser.add_argument("--records", type=int, default=4, help="записей на машину и смену")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Смены вперемешку: в ячейку куба попадают записи не подряд
+    df = pd.json_normalize(make_records(
+        args.equipment, args.days, args.segments, records_per_shift=args.records, interleave=True,
+    ))
+    df["Дата"] = pd.to_datetime(df["Дата"], errors="coerce")
+    reduced = reduce_records(df)
+    cube, t_build = timed(build_cube, reduced)
+    print(f"записей: {len(df)}, ячеек куба: {len(cube)}, построение куба: {t_build:.3f} с")
+
+    days = sorted(df["Дата"].dt.date.unique())
+    equipment = sorted(df["Оборудование"].unique())
+    filters = [
+        {},
+        {"period": (days[0], days[len(days) // 2])},
+        {"equipment": equipment[:10]},
+        {"shifts": ["1 смена (07-19)"], "fuels": ["ДТ"]},
+    ]
+
+    t_records = t_cube = 0.0
+    diff = 0
+    for _ in range(args.repeat):
+        for f in filters:
+            start = time.perf_counter()
+            part = reduced.loc[apply_filters(df, **f).index]
+            old = compute_kkf(part), compute_kisvr(part)
+            t_records += time.perf_counter() - start
+
+            start = time.perf_counter()
+            cells = slice_cube(cube, **f)
+            new = cube_kkf(cells), cube_kisvr(cells)
+            t_cube += time.perf_counter() - start
+            diff += mismatches(old[0], new[0]) + mismatches(old[1], new[1])
+
+    n = args.repeat * len(filters)
+    print(f"по записям:     {t_records / n * 1000:8.1f} мс на фильтр")
+    print(f"срез куба:      {t_cube / n * 1000:8.1f} мс на фильтр  (x{t_records / t_cube:.1f})")
+    print(f"расхождений на границе округления: {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Разбор продолжительностей: построчный fromisoformat против decode_hours.
+
+    python -m benchmarks.bench_durations --segments 2000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+from analytics.durations import clear_memo, decode_hours
+
+
+def legacy(rows):
+    # Прежний путь: каждая строка разбирается в обоих блоках расчёта
+    total = []
+    for _ in range(2):
+        for row in rows:
+            durations = [datetime.fromisoformat(x) for x in row]
+            total.append([(d.hour + d.minute/60) for d in durations])
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=1_000_000)
+    parser.add_argument("--per-record", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    flat = [
+        f"0001-01-01T{rnd.randrange(12):02d}:{rnd.randrange(60):02d}:{rnd.randrange(60):02d}"
+        for _ in range(args.segments)
+    ]
+    rows = [flat[i:i + args.per_record] for i in range(0, len(flat), args.per_record)]
+    print(f"участков: {len(flat)}, различных значений: {len(set(flat))}")
+
+    start = time.perf_counter()
+    expected = legacy(rows)
+    t_legacy = time.perf_counter() - start
+
+    clear_memo()
+    start = time.perf_counter()
+    hours = decode_hours(flat)
+    t_cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decode_hours(flat)
+    t_warm = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decode_hours(flat, seconds=True)
+    t_seconds = time.perf_counter() - start
+
+    same = np.array_equal(hours, np.concatenate(expected[:len(rows)]))
+    print(f"построчно (2 прохода): {t_legacy:8.3f} с")
+    print(f"decode_hours, холодный: {t_cold:7.3f} с  (x{t_legacy / t_cold:.1f})")
+    print(f"decode_hours, с памятью: {t_warm:6.3f} с  (x{t_legacy / t_warm:.1f})")
+    print(f"decode_hours, секунды: {t_seconds:8.3f} с")
+    print(f"совпадает с прежним расчётом: {'да' if same else 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
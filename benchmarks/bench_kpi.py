@@ -0,0 +1,126 @@
+"""Сравнение прежнего расчёта (groupby + iterrows) с векторным движком.
+
+    python -m benchmarks.bench_kpi --equipment 100 --days 30 --segments 20
+"""
+import argparse
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from analytics.kpi import compute_kisvr, compute_kkf, reduce_records
+from benchmarks.fleet import make_records
+
+
+def legacy_kkf(filtered_df):
+    # Прежний расчёт из app.py
+    kkf_results = []
+    for (equip, date), group in filtered_df.groupby(["Оборудование", filtered_df["Дата"].dt.date]):
+        T_f = 0
+        T_ppr = 0
+        T_pzo = T_ob = T_ln = T_reg = T_rem = 0
+        for _, row in group.iterrows():
+            durations = [datetime.fromisoformat(x) for x in row["ПоказателиОборудованияПоУчасткамПродолжительность"]]
+            durations_hours = [(d.hour + d.minute/60) for d in durations]
+            includes = row["ПоказателиОборудованияПоУчасткамВключенДвигатель"]
+            usage_types = row["ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени"]
+            T_f += sum([dur for dur, inc in zip(durations_hours, includes) if inc])
+            T_ppr += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "ППР"])
+            T_pzo += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "ЕО"])
+            T_ob  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Обед"])
+            T_ln  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Личные надобности"])
+            T_reg += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage in ["Выдача путевого листа", "Заправка"]])
+            T_rem += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage in [
+                "Аварийный ремонт оборудования узлов и агрегатов", "Обкатка ДВС", "ТО", "Ремонт", "ППР"
+            ]])
+        T_kl = 24
+        T_pl = T_kl - T_ppr
+        K_kf = T_f / T_kl if T_kl > 0 else 0
+        denom_ki = T_kl - T_pzo - T_ob - T_ln - T_reg
+        K_io = T_f / denom_ki if denom_ki > 0 else 0
+        denom_ktg = T_kl - T_ob - T_ln
+        K_tg = (denom_ktg - T_rem) / denom_ktg if denom_ktg > 0 else 0
+        kkf_results.append({
+            "Оборудование": equip,
+            "Дата": date,
+            "Календарный фонд (Тк), ч": T_kl,
+            "Плановый фонд (Тпл), ч": round(T_pl, 2),
+            "Фактическое время работы (Тф), ч": round(T_f, 2),
+            "Время ППР (Тппр), ч": round(T_ppr, 2),
+            "Коэф. использования календарного фонда (Ккф)": round(K_kf, 3),
+            "Коэф. использования рабочего фонда (Кио)": round(K_io, 3),
+            "Коэф. технической готовности (Ктг)": round(K_tg, 3),
+        })
+    return pd.DataFrame(kkf_results)
+
+
+def legacy_kisvr(filtered_df):
+    kisvr_results = []
+    for (equip, shift, date), group in filtered_df.groupby(["Оборудование", "Смена", filtered_df["Дата"].dt.date]):
+        T_sm = 0
+        T_sm_f = 0
+        T_pzo = T_ob = T_ln = T_reg = 0
+        for _, row in group.iterrows():
+            durations = [datetime.fromisoformat(x) for x in row["ПоказателиОборудованияПоУчасткамПродолжительность"]]
+            durations_hours = [(d.hour + d.minute/60) for d in durations]
+            includes = row["ПоказателиОборудованияПоУчасткамВключенДвигатель"]
+            usage_types = row["ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени"]
+            T_sm += sum(durations_hours)
+            T_sm_f += sum([dur for dur, inc in zip(durations_hours, includes) if inc])
+            T_pzo += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "ЕО"])
+            T_ob  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Обед"])
+            T_ln  += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage == "Личные надобности"])
+            T_reg += sum([dur for dur, usage in zip(durations_hours, usage_types) if usage in ["Выдача путевого листа", "Заправка"]])
+        T_chsm = T_sm - T_pzo - T_ob - T_ln - T_reg
+        K_is_vr = T_sm_f / T_sm if T_sm > 0 else 0
+        kisvr_results.append({
+            "Оборудование": equip,
+            "Смена": shift,
+            "Дата": date,
+            "Суммарное время (Тсм), ч": round(T_sm, 2),
+            "Рабочее время в смене (Тсмф), ч": round(T_sm_f, 2),
+            "Чистое время работы в смену (Тчсм), ч": round(T_chsm, 2),
+            "Коэф. использования по времени (Кисвр)": round(K_is_vr, 3),
+        })
+    return pd.DataFrame(kisvr_results)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def mismatches(expected, actual):
+    if expected.shape != actual.shape:
+        return max(len(expected), len(actual))
+    return int((expected.to_numpy() != actual.to_numpy()).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--equipment", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--segments", type=int, default=20, help="участков на смену")
+    args = parser.parse_args()
+
+    df = pd.json_normalize(make_records(args.equipment, args.days, args.segments))
+    df["Дата"] = pd.to_datetime(df["Дата"], errors="coerce")
+    n_segments = args.equipment * args.days * 2 * args.segments
+    print(f"записей: {len(df)}, участков: {n_segments}")
+
+    (old_kkf, old_kisvr), t_old = timed(lambda d: (legacy_kkf(d), legacy_kisvr(d)), df)
+
+    def engine(d):
+        reduced = reduce_records(d)
+        return compute_kkf(reduced), compute_kisvr(reduced)
+
+    (new_kkf, new_kisvr), t_new = timed(engine, df)
+
+    print(f"iterrows:       {t_old:8.3f} с")
+    print(f"векторный:      {t_new:8.3f} с  (x{t_old / t_new:.1f})")
+    print(f"расхождений Ккф: {mismatches(old_kkf, new_kkf)}, Кисвр: {mismatches(old_kisvr, new_kisvr)}")
+
+
+if __name__ == "__main__":
+    main()
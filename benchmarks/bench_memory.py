@@ -0,0 +1,52 @@
+"""Память под загруженную выгрузку: таблица json_normalize со списками участков
+против записей с categorical-измерениями и compact.SegmentStore.
+
+    python -m benchmarks.bench_memory --equipment 100 --days 365 --segments 20
+"""
+import argparse
+import io
+import json
+
+import pandas as pd
+
+from analytics.ingest import load_json
+from analytics.pipeline import filter_positions
+from benchmarks.bench_kpi import timed
+from benchmarks.fleet import make_records
+
+MB = 1024 * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--equipment", type=int, default=100)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--segments", type=int, default=20, help="участков на смену")
+    args = parser.parse_args()
+
+    records = make_records(args.equipment, args.days, args.segments)
+    raw = json.dumps(records, ensure_ascii=False).encode()
+    del records
+    print(f"JSON: {len(raw) / MB:.1f} МБ")
+
+    # Прежнее представление: списки строк и bool в object-колонках + копия на фильтр
+    legacy = pd.json_normalize(json.loads(raw))
+    legacy_bytes = legacy.memory_usage(deep=True).sum()
+    print(f"json_normalize:              {legacy_bytes / MB:8.1f} МБ (оценка снизу, + копия на фильтр)")
+    del legacy
+
+    (df, segments), t_load = timed(load_json, io.BytesIO(raw), True)
+    records_bytes = df.memory_usage(deep=True).sum()
+    print(f"записи (categorical):        {records_bytes / MB:8.1f} МБ")
+    print(f"участки (SegmentStore):      {segments.nbytes / MB:8.1f} МБ, {len(segments)} участков, "
+          f"{segments.nbytes / max(len(segments), 1):.2f} байт на участок")
+    print(f"таблица участков (DataFrame): {segments.frame().memory_usage(deep=True).sum() / MB:7.1f} МБ")
+    print(f"итого: x{legacy_bytes / (records_bytes + segments.nbytes):.1f} меньше, загрузка {t_load:.2f} с")
+
+    equipment = df["Оборудование"].cat.categories[:10].tolist()
+    positions = filter_positions(df, equipment=equipment)
+    print(f"фильтр по 10 машинам: {positions.nbytes / MB:.2f} МБ индексов вместо копии записей")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Память на N сессий с одной и той же выгрузкой: таблицы в каждой сессии
+против общего реестра (analytics.registry, memmap).
+
+    python -m benchmarks.bench_registry --equipment 300 --days 90 --sessions 40
+"""
+import argparse
+import io
+import json
+import tempfile
+
+import numpy as np
+
+from analytics.cube import build_cube, cube_kisvr, cube_kkf
+from analytics.ingest import load_json
+from analytics.kpi import reduce_records
+from analytics.registry import Registry
+from benchmarks.bench_kpi import timed
+from benchmarks.fleet import make_records
+
+MB = 1024 * 1024
+
+
+def _mapped(values):
+    base = values
+    while base is not None and not isinstance(base, np.memmap):
+        base = getattr(base, "base", None)
+    return base is not None
+
+
+def heap_bytes(frame):
+    """Байты колонок frame в памяти процесса (без отображённых в память файлов)."""
+    total = 0
+    for name in frame.columns:
+        values = frame[name].array
+        arrays = [values.codes] if hasattr(values, "codes") else [frame[name].to_numpy()]
+        if not all(_mapped(a) for a in arrays):
+            total += int(frame[name].memory_usage(deep=True, index=False))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--equipment", type=int, default=300)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--segments", type=int, default=20, help="участков на смену")
+    parser.add_argument("--sessions", type=int, default=40)
+    args = parser.parse_args()
+
+    raw = json.dumps(make_records(args.equipment, args.days, args.segments), ensure_ascii=False).encode()
+
+    def build():
+        df, segments = load_json(io.BytesIO(raw), streaming=True)
+        return df, build_cube(reduce_records(df, segments))
+
+    # Прежний путь: записи, куб и таблицы показателей в каждой сессии
+    df, cube = build()
+    frames = [df, cube, cube_kkf(cube), cube_kisvr(cube)]
+    per_session = sum(f.memory_usage(deep=True).sum() for f in frames)
+    print(f"в каждой сессии: {per_session / MB:8.1f} МБ x {args.sessions} = "
+          f"{per_session * args.sessions / MB:.1f} МБ")
+
+    with tempfile.TemporaryDirectory() as root:
+        registry = Registry(root)
+        dataset, t_first = timed(registry.acquire, "session-0", "fleet", build)
+        for i in range(1, args.sessions):
+            assert registry.acquire(f"session-{i}", "fleet", build) is dataset
+        heap = sum(heap_bytes(f) for f in (dataset.df, dataset.cube, dataset.kkf, dataset.kisvr))
+        print(f"общий реестр:    {heap / MB:8.1f} МБ в памяти + {dataset.nbytes / MB:.1f} МБ файлов "
+              f"(страничный кэш ОС) на все {len(dataset.owners)} сессий")
+        print(f"регистрация:     {t_first:8.2f} с")
+
+        # Перезапуск сервера: выгрузка открывается с диска без разбора
+        _, t_open = timed(Registry(root).acquire, "session-0", "fleet", build)
+        print(f"открытие с диска: {t_open:7.3f} с")
+
+
+if __name__ == "__main__":
+    main()
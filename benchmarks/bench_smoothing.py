@@ -0,0 +1,94 @@
+"""Сглаживание для графиков: groupby().transform(lambda: rolling) на каждый график
+против одного прохода analytics.smoothing.smoothing_stage.
+
+    python -m benchmarks.bench_smoothing --equipment 1000 --days 365 --window 7
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analytics.kpi import COL_KISVR, COL_TCHSM, DATE, EQUIPMENT, SHIFT, SHIFTS
+from analytics.smoothing import KISVR_METRICS, KKF_METRICS, SMOOTHED, smoothing_stage
+from benchmarks.bench_kpi import timed
+
+
+def make_tables(equipment, days, missing, seed=0):
+    """Таблицы вида cube_kkf / cube_kisvr; часть дней у машин пропущена."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=days).date
+    names = np.array([f"Машина {i:04d}" for i in range(equipment)])
+
+    kisvr = pd.DataFrame({
+        EQUIPMENT: np.repeat(names, days * len(SHIFTS)),
+        SHIFT: np.tile(np.repeat(SHIFTS, days), equipment),
+        DATE: np.tile(dates, equipment * len(SHIFTS)),
+    })
+    kisvr = kisvr[rng.random(len(kisvr)) >= missing].reset_index(drop=True)
+    kisvr[COL_KISVR] = rng.random(len(kisvr))
+    kisvr[COL_TCHSM] = rng.random(len(kisvr)) * 12
+
+    kkf = kisvr.groupby([EQUIPMENT, DATE])[[COL_TCHSM]].sum().reset_index()
+    for column in KKF_METRICS:
+        kkf[column] = rng.random(len(kkf)) * (24 if "Тпл" in column else 1)
+    return kkf[[EQUIPMENT, DATE] + KKF_METRICS], kisvr
+
+
+def legacy(kkf_df, kisvr_df, window):
+    # Прежний путь: у каждого из 12 графиков свой groupby и свой rolling
+    def rolled(frame, keys, column):
+        if keys:
+            return frame.groupby(keys)[column].transform(lambda x: x.rolling(window, min_periods=1).mean())
+        return frame[column].rolling(window, min_periods=1).mean()
+
+    series = {}
+    for column in KKF_METRICS:
+        per_day = kkf_df.groupby(DATE)[column].mean().reset_index()
+        series["average", column] = rolled(per_day, [], column)
+        series["equipment", column] = rolled(kkf_df.copy(), [EQUIPMENT], column)
+    per_day_shift = kisvr_df.groupby([DATE, SHIFT])[COL_KISVR].mean().reset_index()
+    series["average", COL_KISVR] = rolled(per_day_shift, [SHIFT], COL_KISVR)
+    per_day = kisvr_df.groupby(DATE)[COL_TCHSM].mean().reset_index()
+    series["average", COL_TCHSM] = rolled(per_day, [], COL_TCHSM)
+    for column in KISVR_METRICS:
+        series["equipment", column] = rolled(kisvr_df.copy(), [EQUIPMENT, SHIFT], column)
+    return series
+
+
+def same_values(series, stage, kkf_df, kisvr_df):
+    # Сравнение по ключам: порядок строк в результатах разный
+    def keyed(frame, keys, values):
+        return pd.Series(np.asarray(values), index=pd.MultiIndex.from_frame(frame[keys + [DATE]])).sort_index()
+
+    checks = [
+        (series["equipment", c], kkf_df, stage["equipment_kkf"], [EQUIPMENT], c) for c in KKF_METRICS
+    ] + [
+        (series["equipment", c], kisvr_df, stage["equipment_kisvr"], [EQUIPMENT, SHIFT], c) for c in KISVR_METRICS
+    ]
+    for old, frame, new, keys, column in checks:
+        if not np.allclose(keyed(frame, keys, old), keyed(new, keys, new[SMOOTHED[column]])):
+            return False
+    return np.allclose(series["average", COL_KISVR].sort_values().to_numpy(),
+                       stage["average_kisvr"][SMOOTHED[COL_KISVR]].sort_values().to_numpy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--equipment", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--missing", type=float, default=0.1, help="доля пропущенных смен")
+    parser.add_argument("--window", type=int, default=7)
+    args = parser.parse_args()
+
+    kkf_df, kisvr_df = make_tables(args.equipment, args.days, args.missing)
+    print(f"строк Ккф: {len(kkf_df)}, строк Кисвр: {len(kisvr_df)}, окно: {args.window}")
+
+    series, t_legacy = timed(legacy, kkf_df, kisvr_df, args.window)
+    stage, t_stage = timed(smoothing_stage, kkf_df, kisvr_df, args.window)
+    print(f"12 графиков по отдельности: {t_legacy:8.3f} с")
+    print(f"smoothing_stage:            {t_stage:8.3f} с  (x{t_legacy / t_stage:.1f})")
+    print(f"совпадает с прежним расчётом: {'да' if same_values(series, stage, kkf_df, kisvr_df) else 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Открытие истории: разбор JSON против чтения архива Parquet с фильтрами.
+
+    python -m benchmarks.bench_storage --equipment 100 --days 90 --segments 10
+"""
+import argparse
+import io
+import json
+import tempfile
+
+from analytics.ingest import load_json
+from analytics.storage import open_history, read_history, write_dataset
+from benchmarks.bench_kpi import timed
+from benchmarks.fleet import make_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--equipment", type=int, default=100)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--segments", type=int, default=10, help="участков на смену")
+    args = parser.parse_args()
+
+    raw = json.dumps(make_records(args.equipment, args.days, args.segments), ensure_ascii=False).encode()
+    print(f"JSON: {len(raw) / 2**20:.1f} МБ")
+
+    (df, segments), t_json = timed(load_json, io.BytesIO(raw), True)
+    print(f"разбор JSON:            {t_json:8.3f} с")
+
+    with tempfile.TemporaryDirectory() as root:
+        _, t_write = timed(write_dataset, df, segments, root, "bench")
+        print(f"импорт в Parquet:       {t_write:8.3f} с")
+
+        dataset = open_history(root)
+        days = sorted(df["Дата"].dt.date.unique())
+        equipment = sorted(df["Оборудование"].unique())
+        cases = {
+            "весь архив": {},
+            "один месяц": {"period": (days[0], days[min(29, len(days) - 1)])},
+            "5 машин": {"equipment": equipment[:5]},
+        }
+        for label, filters in cases.items():
+            (part, _), t_read = timed(read_history, dataset, *[filters.get(k, ()) for k in ("period", "shifts", "equipment", "fuels")])
+            print(f"Parquet, {label + ':':14} {t_read:8.3f} с  ({len(part)} записей)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Синтетические выгрузки парка техники в формате, который ожидает app.py.
+
+Смена делится на участки, которые в сумме дают 12 часов; виды использования
+и признак работы двигателя распределены примерно как в реальных выгрузках,
+часть машин отдельные дни простаивает в ремонте.
+
+    python -m benchmarks.fleet --equipment 200 --days 90 --segments 20 --out data/fleet.json
+"""
+import argparse
+import json
+import os
+import random
+from datetime import date, timedelta
+
+SHIFTS = ["1 смена (07-19)", "2 смена (19-07)"]
+FUELS = ["ДТ", "АИ-92", "Газ"]
+FUEL_WEIGHTS = [0.7, 0.2, 0.1]
+KINDS = ["Экскаватор", "Самосвал", "Бульдозер", "Погрузчик", "Автогрейдер"]
+
+# Вид использования: (доля участков, вероятность работы двигателя)
+USAGE_PROFILE = {
+    "Работа": (0.50, 1.0),
+    "Простой": (0.10, 0.4),
+    "ЕО": (0.04, 0.2),
+    "Обед": (0.05, 0.0),
+    "Личные надобности": (0.02, 0.0),
+    "Выдача путевого листа": (0.02, 0.1),
+    "Заправка": (0.04, 0.3),
+    "ППР": (0.06, 0.1),
+    "ТО": (0.04, 0.2),
+    "Ремонт": (0.06, 0.1),
+    "Аварийный ремонт оборудования узлов и агрегатов": (0.04, 0.1),
+    "Обкатка ДВС": (0.03, 1.0),
+}
+USAGES = list(USAGE_PROFILE)
+REPAIR_USAGES = ["Ремонт", "Аварийный ремонт оборудования узлов и агрегатов", "ППР"]
+
+SHIFT_MINUTES = 12 * 60
+STEP = 5  # продолжительности кратны 5 минутам
+
+
+def equipment_names(equipment):
+    return [f"{KINDS[i % len(KINDS)]} №{i:03d}" for i in range(equipment)]
+
+
+def _durations(rnd, minutes, parts):
+    # Случайное разбиение minutes на parts участков (не короче STEP)
+    parts = max(1, min(parts, minutes // STEP))
+    cuts = sorted(rnd.sample(range(1, minutes // STEP), parts - 1)) if parts > 1 else []
+    bounds = [0] + [c * STEP for c in cuts] + [minutes]
+    return [b - a for a, b in zip(bounds, bounds[1:])]
+
+
+def iter_records(equipment=50, days=30, segments=10, seed=0, records_per_shift=1, repair_rate=0.02,
+                 interleave=False):
+    """Записи выгрузки по одной: segments участков на смену, records_per_shift записей
+    на машину и смену; repair_rate - доля машино-дней целиком в ремонте.
+    interleave=True - записи машино-дня идут вперемешку по сменам (1, 2, 1, 2...),
+    как в выгрузках, собранных по времени начала записи."""
+    rnd = random.Random(seed)
+    start = date(2024, 1, 1)
+    names = equipment_names(equipment)
+    fuels = {name: rnd.choices(FUELS, FUEL_WEIGHTS)[0] for name in names}
+    weights = [share for share, _ in USAGE_PROFILE.values()]
+    per_record = max(1, segments // records_per_shift)
+    record_minutes = SHIFT_MINUTES // records_per_shift
+
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat() + "T00:00:00"
+        for name in names:
+            in_repair = rnd.random() < repair_rate
+            records = []
+            for shift in SHIFTS:
+                for _ in range(records_per_shift):
+                    minutes = _durations(rnd, record_minutes, per_record)
+                    if in_repair:
+                        usages = [rnd.choice(REPAIR_USAGES) for _ in minutes]
+                    else:
+                        usages = rnd.choices(USAGES, weights, k=len(minutes))
+                    records.append({
+                        "Дата": day,
+                        "Смена": shift,
+                        "Оборудование": name,
+                        "Топливо": fuels[name],
+                        "ПоказателиОборудованияПоУчасткамПродолжительность": [
+                            f"0001-01-01T{m // 60:02d}:{m % 60:02d}:00" for m in minutes
+                        ],
+                        "ПоказателиОборудованияПоУчасткамВключенДвигатель": [
+                            rnd.random() < USAGE_PROFILE[u][1] for u in usages
+                        ],
+                        "ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени": usages,
+                    })
+            if interleave:
+                # [1, 1, 2, 2] -> [1, 2, 1, 2]
+                records = [records[s * records_per_shift + i] for i in range(records_per_shift) for s in range(len(SHIFTS))]
+            yield from records
+
+
+def make_records(equipment=50, days=30, segments=10, seed=0, records_per_shift=1, repair_rate=0.02,
+                 interleave=False):
+    """Синтетические записи в формате выгрузки (records_per_shift на машину и смену)."""
+    return list(iter_records(equipment, days, segments, seed, records_per_shift, repair_rate, interleave))
+
+
+def write_json(path, **params):
+    """Пишет выгрузку в файл по записи, не собирая её в памяти; возвращает число записей."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for record in iter_records(**params):
+            f.write(",\n" if count else "\n")
+            json.dump(record, f, ensure_ascii=False)
+            count += 1
+        f.write("\n]\n")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--equipment", type=int, default=50, help="машин в парке")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--segments", type=int, default=10, help="участков на смену")
+    parser.add_argument("--records", type=int, default=1, help="записей на машину и смену")
+    parser.add_argument("--repair-rate", type=float, default=0.02, help="доля машино-дней в ремонте")
+    parser.add_argument("--interleave", action="store_true", help="записи машино-дня вперемешку по сменам")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="data/fleet.json")
+    args = parser.parse_args()
+
+    count = write_json(
+        args.out, equipment=args.equipment, days=args.days, segments=args.segments,
+        seed=args.seed, records_per_shift=args.records, repair_rate=args.repair_rate,
+        interleave=args.interleave,
+    )
+    print(f"{args.out}: {count} записей, {os.path.getsize(args.out) / 1024 / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Набор бенчмарков всего конвейера на синтетическом парке (benchmarks.fleet).
+
+Этапы: загрузка JSON, суммы по записям и куб, фильтры, таблицы Ккф и Кисвр,
+средние, сглаживание, построение и сериализация 12 графиков. Каждый масштаб
+считается в отдельном процессе, для этапов печатаются время и пик памяти
+процесса; с --out результаты дописываются в JSONL, с --baseline -
+сравниваются с прошлым запуском.
+
+    python -m benchmarks.suite                          # 10k и 1M участков
+    python -m benchmarks.suite --scales 10k 1m 10m --out results/bench.jsonl
+    python -m benchmarks.suite --baseline results/bench.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from analytics.charts import MAX_TRACES, entity_pages, line_figure
+from analytics.cube import build_cube, cube_kisvr, cube_kkf, slice_cube
+from analytics.ingest import load_json
+from analytics.kpi import EQUIPMENT, SHIFT, reduce_records
+from analytics.pipeline import filter_positions, period_averages
+from analytics.profiling import Profiler, activate, stage
+from analytics.smoothing import SMOOTHED, smoothing_stage
+from benchmarks.fleet import write_json
+
+# Масштабы по числу участков: машины x дни x 2 смены x участков на смену
+SCALES = {
+    "10k": {"equipment": 10, "days": 25, "segments": 20},
+    "1m": {"equipment": 100, "days": 250, "segments": 20},
+    "10m": {"equipment": 1000, "days": 250, "segments": 20},
+}
+
+# Этап медленнее прошлого запуска во столько раз - регрессия; этапы короче
+# MIN_SECONDS не сравниваются, их время - в основном шум
+REGRESSION = 1.25
+MIN_SECONDS = 0.05
+
+# Графики дашборда: (серия из smoothing_stage, показатель, цвет, тип линии)
+CHARTS = [
+    ("average_kkf", "Коэф. использования календарного фонда (Ккф)", None, None),
+    ("average_kkf", "Плановый фонд (Тпл), ч", None, None),
+    ("average_kisvr", "Коэф. использования по времени (Кисвр)", SHIFT, None),
+    ("average_chsm", "Чистое время работы в смену (Тчсм), ч", None, None),
+    ("average_kkf", "Коэф. использования рабочего фонда (Кио)", None, None),
+    ("average_kkf", "Коэф. технической готовности (Ктг)", None, None),
+    ("equipment_kkf", "Коэф. использования календарного фонда (Ккф)", EQUIPMENT, None),
+    ("equipment_kkf", "Плановый фонд (Тпл), ч", EQUIPMENT, None),
+    ("equipment_kisvr", "Коэф. использования по времени (Кисвр)", EQUIPMENT, SHIFT),
+    ("equipment_kisvr", "Чистое время работы в смену (Тчсм), ч", EQUIPMENT, SHIFT),
+    ("equipment_kkf", "Коэф. использования рабочего фонда (Кио)", EQUIPMENT, None),
+    ("equipment_kkf", "Коэф. технической готовности (Ктг)", EQUIPMENT, None),
+]
+
+
+def filter_sets(df):
+    """Типичные состояния фильтров боковой панели."""
+    days = df["Дата"].dropna().sort_values()
+    first, middle = days.iloc[0].date(), days.iloc[len(days) // 2].date()
+    equipment = sorted(df[EQUIPMENT].dropna().unique().tolist())
+    return [
+        {"period": (first, middle)},
+        {"equipment": equipment[:10]},
+        {"shifts": ["1 смена (07-19)"]},
+        {"fuels": ["ДТ"], "period": (first, middle)},
+    ]
+
+
+def run_scale(name, params, workdir):
+    """Все этапы на одном масштабе; вызывается в отдельном процессе."""
+    path = os.path.join(workdir, f"fleet_{name}.json")
+    write_json(path, **params)
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    profiler = Profiler()
+    activate(profiler)
+    try:
+        with open(path, "rb") as f:
+            df, segments = load_json(f, streaming=True)
+        with stage("Суммы по записям", rows=len(df), segments=len(segments)):
+            reduced = reduce_records(df, segments)
+        with stage("Куб") as info:
+            cube = build_cube(reduced)
+            info["cells"] = len(cube)
+        del reduced
+
+        with stage("Фильтры") as info:
+            sets = filter_sets(df)
+            for filters in sets:
+                filter_positions(df, **filters)
+                slice_cube(cube, **filters)
+            info["filters"] = len(sets)
+
+        with stage("Ккф") as info:
+            kkf_df = cube_kkf(cube)
+            info["rows"] = len(kkf_df)
+        with stage("Кисвр") as info:
+            kisvr_df = cube_kisvr(cube)
+            info["rows"] = len(kisvr_df)
+        with stage("Средние"):
+            period_averages(kkf_df, kisvr_df)
+        with stage("Сглаживание", rows=len(kkf_df) + len(kisvr_df)):
+            smoothed = smoothing_stage(kkf_df, kisvr_df, 7)
+
+        with stage("Графики", figures=len(CHARTS)) as info:
+            page = entity_pages(kkf_df[EQUIPMENT], MAX_TRACES)[0]
+            payload = 0
+            for series, metric, color, dash in CHARTS:
+                frame = smoothed[series]
+                if color == EQUIPMENT:
+                    frame = frame[frame[EQUIPMENT].isin(page)]
+                fig = line_figure(frame, x="Дата", y=SMOOTHED[metric], color=color, line_dash=dash)
+                # Сериализация, как при передаче в браузер
+                payload += len(fig.to_json())
+            info["payload_mb"] = round(payload / 1024 / 1024, 2)
+    finally:
+        os.remove(path)
+    return {"json_mb": round(size_mb, 1), "stages": profiler.stages}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path):
+    """Последнее время каждого (масштаб, этап) из прошлых запусков."""
+    baseline = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            baseline[entry["scale"], entry["stage"]] = entry["seconds"]
+    return baseline
+
+
+def report(name, params, result, baseline):
+    segments = 2 * params["equipment"] * params["days"] * params["segments"]
+    print(f"\n== {name}: {params['equipment']} машин, {params['days']} дней, "
+          f"{segments:,} участков, JSON {result['json_mb']} МБ")
+    print(f"{'этап':<28}{'время, с':>10}{'пик, МБ':>10}  счётчики")
+    for entry in result["stages"]:
+        counts = {k: v for k, v in entry.items()
+                  if k not in ("stage", "depth", "seconds", "rss_mb", "rss_delta_mb", "peak_mb")}
+        line = (f"{'  ' * entry['depth'] + entry['stage']:<28}{entry['seconds']:>10.3f}"
+                f"{entry.get('peak_mb', float('nan')):>10.0f}  "
+                + ", ".join(f"{k}={v}" for k, v in counts.items()))
+        before = baseline.get((name, entry["stage"]))
+        if before and max(before, entry["seconds"]) >= MIN_SECONDS:
+            ratio = entry["seconds"] / before
+            line += f"  [x{ratio:.2f} к прошлому{' - РЕГРЕССИЯ' if ratio > REGRESSION else ''}]"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["10k", "1m"])
+    parser.add_argument("--out", help="дописать результаты в JSONL")
+    parser.add_argument("--baseline", help="JSONL прошлых запусков для сравнения")
+    parser.add_argument("--workdir", default=tempfile.gettempdir(), help="каталог для сгенерированных JSON")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline) if args.baseline and os.path.exists(args.baseline) else {}
+    revision = git_revision()
+    context = multiprocessing.get_context("spawn")
+    for name in args.scales:
+        params = SCALES[name]
+        # Новый процесс на масштаб: пик памяти не переходит от предыдущего
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_scale, name, params, args.workdir).result()
+        report(name, params, result, baseline)
+        if args.out:
+            directory = os.path.dirname(args.out)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(args.out, "a", encoding="utf-8") as f:
+                for entry in result["stages"]:
+                    f.write(json.dumps(
+                        {"scale": name, "revision": revision, **params, **entry},
+                        ensure_ascii=False, default=str,
+                    ) + "\n")
+
+
+if __name__ == "__main__":
+    main()
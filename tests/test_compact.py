@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.compact import SegmentStore
+
+
+def _store(usages):
+    segments = pd.DataFrame({
+        "rec": np.arange(len(usages), dtype=np.int64),
+        "hours": np.ones(len(usages)),
+        "engine": np.ones(len(usages), dtype=bool),
+        "usage": pd.Categorical(usages),
+    })
+    return SegmentStore.from_frame(segments, len(usages))
+
+
+def test_concat_too_many_usages():
+    # В каждом блоке меньше 128 видов, вместе - больше: код int8 переполнился бы
+    first = _store([f"вид {i}" for i in range(100)])
+    second = _store([f"вид {i}" for i in range(100, 200)])
+    with pytest.raises(ValueError):
+        SegmentStore.concat([first, second])
+
+
+def test_concat_block_without_segments():
+    store = SegmentStore.concat([_store(["Работа", "Обед"]), _store([])])
+    assert list(store.usage()) == ["Работа", "Обед"]
+    assert store.n_records == 2
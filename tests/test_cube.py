@@ -0,0 +1,68 @@
+import pandas as pd
+
+from analytics.cube import build_cube, cube_kisvr, cube_kkf, slice_cube
+from analytics.kpi import BUCKETS, COL_KKF, compute_kisvr, compute_kkf, reduce_records
+from analytics.merge import merge_cubes
+
+
+def _record(shift, minutes, equipment="A", fuel="ДТ"):
+    return {
+        "Дата": "2024-01-01T00:00:00",
+        "Смена": shift,
+        "Оборудование": equipment,
+        "Топливо": fuel,
+        "ПоказателиОборудованияПоУчасткамПродолжительность": [
+            f"0001-01-01T{m // 60:02d}:{m % 60:02d}:00" for m in minutes
+        ],
+        "ПоказателиОборудованияПоУчасткамВключенДвигатель": [True] * len(minutes),
+        "ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени": ["Работа"] * len(minutes),
+    }
+
+
+def _reduced(records):
+    df = pd.json_normalize(records)
+    df["Дата"] = pd.to_datetime(df["Дата"])
+    return reduce_records(df)
+
+
+RECORDS = [
+    _record("1 смена (07-19)", [210, 85]),
+    _record("2 смена (19-07)", [70, 290]),
+    _record("1 смена (07-19)", [35, 120]),
+    _record("1 смена (07-19)", [45], equipment="B"),
+    _record("2 смена (19-07)", [30], equipment="B", fuel=None),
+]
+
+
+def test_cells():
+    cube = build_cube(_reduced(RECORDS))
+    # Две записи первой смены машины A - одна ячейка; запись без топлива - своя
+    assert len(cube) == 4
+    assert (cube[BUCKETS].dtypes == "int64").all()
+
+
+def test_order_does_not_matter():
+    # Смены вперемешку (1, 2, 1) и подряд: Тф = 13.5 ч, Ккф ровно на границе округления
+    interleaved = build_cube(_reduced(RECORDS))
+    ordered = build_cube(_reduced([RECORDS[i] for i in (0, 2, 1, 3, 4)]))
+    assert cube_kkf(interleaved).equals(cube_kkf(ordered))
+    assert cube_kisvr(interleaved).equals(cube_kisvr(ordered))
+    # Точная сумма: 0.5625 округляется как число, без погрешности сложения
+    assert cube_kkf(interleaved)[COL_KKF].tolist() == [round(13.5 / 24, 3), round(1.25 / 24, 3)]
+
+
+def test_matches_records_path():
+    reduced = _reduced(RECORDS[3:])
+    cube = build_cube(reduced)
+    assert cube_kkf(cube).equals(compute_kkf(reduced))
+    assert cube_kisvr(cube).equals(compute_kisvr(reduced))
+    assert len(cube_kkf(slice_cube(cube, fuels=["ДТ"]))) == 1
+
+
+def test_merge_sums_cells():
+    first = build_cube(_reduced(RECORDS[:2]))
+    second = build_cube(_reduced(RECORDS[2:]))
+    # Слияние даёт categorical, а записи из json_normalize - строки
+    pd.testing.assert_frame_equal(
+        merge_cubes([first, second]), build_cube(_reduced(RECORDS)), check_dtype=False, check_categorical=False,
+    )
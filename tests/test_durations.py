@@ -0,0 +1,38 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from analytics.durations import decode_hours
+from analytics.ingest import load_json
+
+
+def test_decode_hours():
+    hours = decode_hours(["0001-01-01T01:30:00", "0001-01-01T10:00:45", "0001-01-01T01:30:00"])
+    assert hours.tolist() == [1.5, 10.0, 1.5]
+    assert decode_hours(["0001-01-01T10:00:45"], seconds=True)[0] == 10 + 45 / 3600
+    assert decode_hours([]).dtype == np.float64
+
+
+@pytest.mark.parametrize("values", [["0001-01-01T10:00:00", None], [None], [np.nan, "0001-01-01T01:00:00"]])
+def test_decode_hours_null(values):
+    # null не должен получать продолжительность другого участка
+    with pytest.raises(ValueError):
+        decode_hours(values)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_load_null_duration(streaming):
+    record = {
+        "Дата": "2024-01-01T08:00:00",
+        "Смена": "1 смена (07-19)",
+        "Оборудование": "A",
+        "Топливо": "ДТ",
+        "ПоказателиОборудованияПоУчасткамПродолжительность": ["0001-01-01T10:00:00", None],
+        "ПоказателиОборудованияПоУчасткамВключенДвигатель": [False, True],
+        "ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени": ["Работа", "Работа"],
+    }
+    raw = json.dumps([record], ensure_ascii=False).encode("utf-8")
+    with pytest.raises(ValueError):
+        load_json(io.BytesIO(raw), streaming=streaming)
@@ -0,0 +1,80 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from analytics.ingest import iter_json_records, load_json, with_segments
+from analytics.merge import merge_results, reduce_source
+
+RECORD = {
+    "Дата": "2024-01-01T08:00:00",
+    "Смена": "1 смена (07-19)",
+    "Оборудование": "A",
+    "Топливо": "ДТ",
+    "ПоказателиОборудованияПоУчасткамПродолжительность": ["0001-01-01T01:00:00"],
+    "ПоказателиОборудованияПоУчасткамВключенДвигатель": [True],
+    "ПоказателиОборудованияПоУчасткамВидИспользованияРабочегоВремени": ["Работа"],
+}
+
+
+def _dump(records):
+    return json.dumps(records, ensure_ascii=False).encode("utf-8")
+
+
+def test_chunk_without_fuel():
+    # Блок из 5000 записей подряд без топлива: категории блока пустые
+    without_fuel = {k: v for k, v in RECORD.items() if k != "Топливо"}
+    raw = _dump([RECORD] * 3 + [without_fuel] * 5000)
+    df, segments = load_json(io.BytesIO(raw), streaming=True)
+    assert len(df) == 5003
+    assert df["Топливо"].notna().sum() == 3
+    assert list(df["Топливо"].cat.categories) == ["ДТ"]
+
+
+def test_merge_file_without_fuel():
+    without_fuel = {k: v for k, v in RECORD.items() if k != "Топливо"}
+    df, cube = merge_results([reduce_source(_dump([RECORD])), reduce_source(_dump([without_fuel]))])
+    assert len(df) == 2
+    assert df["Топливо"].notna().sum() == 1
+
+
+@pytest.mark.parametrize("raw", [
+    b"[1,,2]", b"[{} {}]", b"[1,2] x", b"[1,2,]", b"[,1]", b"[1", b"{} []",
+])
+def test_invalid_json(raw):
+    with pytest.raises(ValueError):
+        list(iter_json_records(io.BytesIO(raw)))
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 1 << 20])
+def test_valid_json(read_size):
+    raw = b' \n[ {"a": 1} ,\n{"b": [2, 3]} ]\n '
+    assert list(iter_json_records(io.BytesIO(raw), read_size)) == [{"a": 1}, {"b": [2, 3]}]
+    assert list(iter_json_records(io.BytesIO(b"[ ]"), read_size)) == []
+    assert list(iter_json_records(io.BytesIO(b'{"a": 1} '), read_size)) == [{"a": 1}]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_dates_with_timezone(streaming):
+    raw = _dump([dict(RECORD, Дата="2024-01-05T08:00:00+03:00")])
+    df, segments = load_json(io.BytesIO(raw), streaming=streaming)
+    assert df["Дата"].dt.tz is None
+    assert df["Дата"].iloc[0] == pd.Timestamp("2024-01-05 08:00:00")
+
+
+def test_chunk_without_segments():
+    bare = {k: v for k, v in RECORD.items() if not k.startswith("ПоказателиОборудования")}
+    df, segments = load_json(io.BytesIO(_dump([RECORD] * 2 + [bare] * 5000)), streaming=True)
+    assert len(df) == 5002
+    assert list(segments.usage()) == ["Работа", "Работа"]
+
+
+def test_records_keep_dimensions_only():
+    # Списки участков не хранятся в записях (и не попадают в pickle реестра)
+    df, segments = load_json(io.BytesIO(_dump([RECORD, dict(RECORD, Оборудование="B")])))
+    assert list(df.columns) == ["Дата", "Смена", "Оборудование", "Топливо"]
+    shown = with_segments(df, segments, [1])
+    assert shown["Оборудование"].tolist() == ["B"]
+    for column in list(RECORD)[4:]:
+        assert shown[column].tolist() == [RECORD[column]]
@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+from analytics.cube import cube_kisvr, cube_kkf
+from analytics.kpi import COL_KISVR, COL_KKF
+from analytics.merge import RunningAverages, merge_results, reduce_source
+from benchmarks.fleet import make_records
+
+
+def test_running_averages():
+    records = make_records(10, 6, 5, records_per_shift=2, interleave=True)
+    # Третий файл повторяет дни первых: строки таблиц пересчитываются
+    parts = [records[0::2], records[1::2], records[:40]]
+    results = [reduce_source(json.dumps(p, ensure_ascii=False).encode("utf-8")) for p in parts]
+    running = RunningAverages()
+    for i, result in enumerate(results, 1):
+        running.add(result)
+        df, cube = merge_results(results[:i])
+        assert running.records == len(df)
+        assert running.mean(COL_KKF) == pytest.approx(cube_kkf(cube)[COL_KKF].mean())
+        assert running.mean(COL_KISVR) == pytest.approx(cube_kisvr(cube)[COL_KISVR].mean())
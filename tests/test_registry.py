@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pandas as pd
+
+from analytics.cube import build_cube
+from analytics.kpi import reduce_records
+from analytics.registry import Registry
+from benchmarks.fleet import make_records
+
+
+def _build(errors=None):
+    df = pd.json_normalize(make_records(3, 2, 4))
+    df["Дата"] = pd.to_datetime(df["Дата"])
+    result = df[["Дата", "Смена", "Оборудование", "Топливо"]], build_cube(reduce_records(df))
+    return result if errors is None else (*result, errors)
+
+
+def test_errors_survive_restart(tmp_path):
+    errors = [("bad.json", "Некорректный формат JSON")]
+    dataset = Registry(str(tmp_path)).acquire("s1", "key", lambda: _build(errors))
+    assert dataset.errors == errors
+    # После перезапуска выгрузка открывается с диска, без сборки
+    reopened = Registry(str(tmp_path)).acquire("s1", "key", lambda: 1 / 0)
+    assert reopened.errors == errors
+    assert reopened.kkf.equals(dataset.kkf)
+
+
+def test_concurrent_acquire(tmp_path):
+    registry = Registry(str(tmp_path))
+    builds, got = [], {}
+    start = threading.Barrier(8)
+
+    def build():
+        builds.append(1)
+        time.sleep(0.05)
+        return _build()
+
+    def session(owner):
+        start.wait()
+        got[owner] = registry.acquire(owner, "key", build)
+
+    threads = [threading.Thread(target=session, args=(f"s{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert len({id(d) for d in got.values()}) == 1
+    assert set(got["s0"].owners) == set(got)
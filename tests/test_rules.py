@@ -0,0 +1,143 @@
+import ast
+import copy
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import rules
+from analytics.kpi import REQUIRED_COLUMNS
+from analytics.rules import DEFAULT_RULES, Rules, _check, _evaluate, _record_chunks, ratio
+
+with open(DEFAULT_RULES, encoding="utf-8") as f:
+    TABLE = json.load(f)
+
+NAMES = {"a", "b", "T_kl"}
+
+
+def _formula(text, **values):
+    tree = ast.parse(text, mode="eval")
+    _check(tree, NAMES, text)
+    return _evaluate(tree, values)
+
+
+def test_ratio():
+    assert ratio([1.0, 2.0, 3.0], [0.0, 4.0, -1.0]).tolist() == [0.0, 0.5, 0.0]
+    assert ratio(1.0, np.array([2.0])).tolist() == [0.5]
+
+
+def test_evaluate():
+    a, b = np.array([1.0, 6.0]), np.array([0.0, 3.0])
+    assert _formula("-(a + b) * 2 - T_kl / 4", a=a, b=b, T_kl=24).tolist() == [-8.0, -24.0]
+    assert _formula("ratio(a, b)", a=a, b=b).tolist() == [0.0, 2.0]
+    assert _formula("max(min(a, 2), b)", a=a, b=b).tolist() == [1.0, 3.0]
+
+
+@pytest.mark.parametrize("text", [
+    "c + 1",
+    "a ** 2",
+    "a % b",
+    "a > b",
+    "a if b else 0",
+    "a.real",
+    "a[0]",
+    "'a'",
+    "True + a",
+    "abs(a)",
+    "ratio(a, b=b)",
+    "__import__('os')",
+    "(lambda: a)()",
+    "[a, b]",
+])
+def test_rejected(text):
+    with pytest.raises(ValueError):
+        _check(ast.parse(text, mode="eval"), NAMES, text)
+
+
+def _rules(**changes):
+    table = copy.deepcopy(TABLE)
+    table.update(changes)
+    return Rules(table, required=REQUIRED_COLUMNS)
+
+
+def test_default_table():
+    compiled = _rules()
+    assert compiled.buckets == list(TABLE["buckets"])
+    assert compiled.regulation == TABLE["regulation"]
+    assert compiled.digest != _rules(regulation="Другой").digest
+
+
+@pytest.mark.parametrize("changes", [
+    {"version": 2},
+    {"constants": {}},
+    {"buckets": {"T_f": {"engine": True, "fuel": ["ДТ"]}}},
+    {"kkf": {k: v for k, v in TABLE["kkf"].items() if "Ккф" not in k}},
+    {"kisvr": {}},
+])
+def test_invalid_table(changes):
+    with pytest.raises(ValueError):
+        _rules(**changes)
+
+
+BUCKETS = {
+    "on": {"engine": True},
+    "off_repair": {"usage": ["Ремонт"], "engine": False},
+    "repair": {"usage": ["Ремонт"]},
+    "all": {},
+}
+
+
+def _small():
+    return Rules(dict(TABLE, buckets=BUCKETS, kkf={}, kisvr={}))
+
+
+def test_lookup():
+    table = _small().lookup(pd.Index(["Работа", "Ремонт"]))
+    # Строка - код вида * 2 + двигатель; пропуск - последний код
+    assert table.tolist() == [
+        [False, False, False, True],  # Работа, двигатель выключен
+        [True, False, False, True],   # Работа, включен
+        [False, True, True, True],    # Ремонт, выключен
+        [True, False, True, True],    # Ремонт, включен
+        [False, False, False, True],  # без вида, выключен
+        [True, False, False, True],   # без вида, включен
+    ]
+
+
+def test_bucket_sums():
+    rec = np.array([0, 0, 0, 1, 1, 3])
+    hours = np.array([1.0, 2.0, 4.0, 8.0, 16.0, 32.0])
+    engine = np.array([True, False, False, True, False, False])
+    usage = pd.Categorical(["Работа", "Ремонт", None, "Ремонт", "Ремонт", None])
+    sums = _small().bucket_sums(rec, hours, engine, usage, 5)
+    assert sums.tolist() == [
+        [1.0, 2.0, 2.0, 7.0],
+        [8.0, 16.0, 24.0, 24.0],
+        [0.0, 0.0, 0.0, 0.0],
+        [0.0, 0.0, 0.0, 32.0],
+        [0.0, 0.0, 0.0, 0.0],
+    ]
+
+
+def test_record_chunks():
+    rec = np.array([0, 0, 1, 1, 1, 2, 3, 3])
+    # Граница куска не разрезает запись
+    assert _record_chunks(rec, 3) == [(0, 2), (2, 5), (5, 8)]
+    # Запись длиннее куска - кусок до её конца
+    assert _record_chunks(np.array([0, 1, 1, 1, 1, 2]), 2) == [(0, 1), (1, 5), (5, 6)]
+    assert _record_chunks(rec, 100) == [(0, 8)]
+    # Участки не по порядку записей - одним куском
+    assert _record_chunks(np.array([1, 0, 2, 3]), 1) == [(0, 4)]
+
+
+def test_chunked_sums(monkeypatch):
+    rng = np.random.default_rng(0)
+    rec = np.sort(rng.integers(0, 50, 1000))
+    hours = rng.integers(1, 600, 1000) / 60
+    engine = rng.random(1000) < 0.5
+    usage = pd.Categorical(rng.choice(["Работа", "Ремонт", "Обед"], 1000))
+    compiled = _small()
+    whole = compiled.bucket_sums(rec, hours, engine, usage, 50)
+    monkeypatch.setattr(rules, "CHUNK_SEGMENTS", 7)
+    assert np.array_equal(compiled.bucket_sums(rec, hours, engine, usage, 50), whole)
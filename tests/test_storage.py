@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from analytics.compact import SegmentStore
+from analytics.storage import open_history, read_history, write_dataset
+
+
+def _export(dates, equipment):
+    df = pd.DataFrame({
+        "Дата": pd.to_datetime(dates),
+        "Смена": pd.Categorical(["1 смена (07-19)"] * len(dates)),
+        "Оборудование": pd.Categorical(equipment),
+        "Топливо": pd.Categorical(["ДТ"] * len(dates)),
+    })
+    segments = pd.DataFrame({
+        "rec": np.arange(len(dates), dtype=np.int64),
+        "hours": np.ones(len(dates)),
+        "engine": np.ones(len(dates), dtype=bool),
+        "usage": pd.Categorical(["Работа"] * len(dates)),
+    })
+    return df, SegmentStore.from_frame(segments, len(dates))
+
+
+def test_rewrite_replaces_whole_dataset(tmp_path):
+    # Прежняя выгрузка с тем же именем - другие месяцы и оборудование
+    write_dataset(*_export(["2024-03-01"] * 4, ["A", "B", "C", "D"]), str(tmp_path), "export")
+    write_dataset(*_export(["2025-01-10", "2025-01-11"], ["E", "E"]), str(tmp_path), "export")
+    df, segments = read_history(open_history(str(tmp_path)))
+    assert len(df) == 2
+    assert (df["Дата"].dt.year == 2025).all()
+    assert len(segments) == 2